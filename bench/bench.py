@@ -0,0 +1,404 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+'''
+Benchmark treepick without a terminal, by driving the tree through a fake
+curses screen over synthetic trees, and reporting how long each keystroke
+takes to be handled and drawn, how many filesystem calls were made and the
+peak memory used. Run from the root of the repository:
+
+    python bench/bench.py --save baseline.json
+    python bench/bench.py --compare baseline.json
+
+Trees are generated once under --dir and reused. Each scenario runs in its
+own process, so nothing is cached between them and peak memory is its own.
+'''
+
+import argparse
+import curses
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SIZES = {
+    'wide': 100000,  # files in one directory
+    'deep': 2000,  # levels of directories, each with a file in
+    'mixed': 1000,  # files in each of 10 * 10 * 10 directories
+}
+
+
+###############################################################################
+#                               SYNTHETIC TREES                               #
+###############################################################################
+
+def touch(name, dir_fd):
+    os.close(os.open(name, os.O_CREAT | os.O_WRONLY, 0o644, dir_fd=dir_fd))
+
+
+def mkwide(path, count):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for i in range(count):
+            touch('f{:06d}'.format(i), fd)
+    finally:
+        os.close(fd)
+
+
+def mkdeep(path, count):
+    # relative to a descriptor, as the full path soon gets too long to use
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        for i in range(count):
+            touch('f', fd)
+            os.mkdir('d', dir_fd=fd)
+            child = os.open('d', os.O_RDONLY, dir_fd=fd)
+            os.close(fd)
+            fd = child
+    finally:
+        os.close(fd)
+
+
+def mkmixed(path, count):
+    for a in range(10):
+        for b in range(10):
+            for c in range(10):
+                leaf = os.path.join(path, 'a{}'.format(a), 'b{}'.format(b),
+                                    'c{}'.format(c))
+                os.makedirs(leaf)
+                mkwide(leaf, count)
+
+
+def mktree(base, name, count):
+    '''
+    Return the path of a synthetic tree, generating it first if it hasn't
+    been already at this size.
+    '''
+    path = os.path.join(base, '{}-{}'.format(name, count))
+    done = os.path.join(path, '.done')
+    if not os.path.exists(done):
+        print("Generating {} ...".format(path), file=sys.stderr)
+        if os.path.exists(path):
+            subprocess.check_call(['rm', '-rf', path])
+        os.makedirs(path)
+        {'wide': mkwide, 'deep': mkdeep, 'mixed': mkmixed}[name](path, count)
+        touch(done, None)
+    return path
+
+
+###############################################################################
+#                                 FAKE CURSES                                 #
+###############################################################################
+
+class Script:
+    '''
+    Feeds keys to the tree, one per frame, recording how long each one takes
+    from being read until the tree asks for the next key after drawing, and
+    any task it started has finished.
+    '''
+    def __init__(self):
+        self.steps = iter([])
+        self.times = defaultdict(list)
+        self.current = None
+        self.drained = False
+        self.hold = lambda: False  # true while the last key is still working
+
+    def load(self, steps):
+        self.steps = iter(steps + [(None, ord('q'))])
+        self.current = None  # the q that ended the last run has been handled
+
+    def getch(self):
+        if self.current is not None and self.hold():
+            return -1
+        now = time.perf_counter()
+        if self.current is not None:
+            if not self.drained:
+                self.drained = True
+                return -1  # nothing else queued, so the tree draws now
+            label, start = self.current
+            if label is not None:
+                self.times[label].append(now - start)
+        label, key = next(self.steps)
+        if isinstance(key, str):
+            key = ord(key)
+        self.current, self.drained = (label, time.perf_counter()), False
+        return key
+
+
+class Window:
+    '''
+    Just enough of a curses window for the tree to draw into.
+    '''
+    def __init__(self, script, lines, cols):
+        self.script = script
+        self.lines, self.cols = lines, cols
+
+    def getmaxyx(self):
+        return self.lines, self.cols
+
+    def resize(self, lines, cols):
+        self.lines, self.cols = lines, cols
+
+    def getch(self):
+        return self.script.getch()
+
+    def subwin(self, *args):
+        return Window(self.script, 1, self.cols)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def fake(script, lines, cols):
+    '''
+    Replace the parts of curses that need a terminal, returning the screen.
+    '''
+    def newwin(nlines, ncols, y=0, x=0):
+        return Window(script, nlines or lines - y, ncols or cols - x)
+
+    curses.newwin = newwin
+    curses.newpad = lambda nlines, ncols: Window(script, nlines, ncols)
+    curses.curs_set = lambda visibility: None
+    curses.init_pair = lambda pair, fg, bg: None
+    curses.color_pair = lambda pair: pair << 8
+    curses.doupdate = lambda: None
+    return Window(script, lines, cols)
+
+
+###############################################################################
+#                               SYSCALL COUNTING                              #
+###############################################################################
+
+def counting(calls):
+    '''
+    Wrap the filesystem calls treepick makes through the os module, so each
+    call is counted. Calls made from C, like DirEntry.stat, aren't seen.
+    '''
+    for name in ('scandir', 'stat', 'lstat', 'listdir'):
+        def wrapper(*args, _func=getattr(os, name), _name=name, **kwargs):
+            calls[_name] += 1
+            return _func(*args, **kwargs)
+        setattr(os, name, wrapper)
+
+
+###############################################################################
+#                                  SCENARIOS                                  #
+###############################################################################
+
+def times(label, key, n):
+    return [(label, key)] * n
+
+
+def wide(run, find, count):
+    run(times('dn', 'j', 500) + times('pgdn', 'f', 100) +
+        [('bottom', 'G'), ('top', 'g')] + times('pick', ' ', 200) +
+        times('pickall', 'v', 2) + times('hidden', '.', 2))
+    find('f{:06d}'.format(count - 1))
+    run(times('findnext', 'n', 50) + times('findprev', 'N', 50))
+
+
+def deep(run, find, count):
+    run(times('expand', 'l', count) + times('up', 'k', 200) +
+        [('top', 'g'), ('bottom', 'G')] + times('prevparent', 'K', 200) +
+        [('collapse_all', 'H'), ('top', 'g')])
+    find('f')
+    run(times('findnext', 'n', 50))
+
+
+def mixed(run, find, count):
+    run([('expand_all', 'L')] + times('dn', 'j', 1000) +
+        times('nextparent', 'J', 100) + times('prevparent', 'K', 100) +
+        times('pgdn', 'f', 200) + [('bottom', 'G'), ('top', 'g')] +
+        times('expand_all', 'L', 20) + times('collapse', 'h', 20))
+    find('f00{}'.format(count // 2))
+    run(times('findnext', 'n', 50))
+
+
+SCENARIOS = {'wide': wide, 'deep': deep, 'mixed': mixed}
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def at(p):
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+    return {'n': len(samples), 'p50': at(0.5), 'p90': at(0.9),
+            'p99': at(0.99), 'max': samples[-1] * 1000}
+
+
+def scenario(name, root, count, lines, cols):
+    '''
+    Run one scenario in this process, returning its results.
+    '''
+    import treepick.keys
+    from treepick.keys import Keys
+    treepick.keys.FRAME = 0  # keys come as fast as the tree can draw them
+    calls = defaultdict(int)
+    counting(calls)
+    script = Script()
+    screen = fake(script, lines, cols)
+    start = time.perf_counter()
+    script.load([])
+    tree = Keys(screen, root, True, picked=[], expanded=set([root]),
+                cache=None)
+    # keys come from the script, so the tree waits on a pipe nothing is
+    # written to, rather than on stdin
+    tree.input, unread = os.pipe()
+    script.hold = lambda: tree.tasks
+    tree.getkeys()  # until the first frame has been drawn
+    startup = (time.perf_counter() - start) * 1000
+    while tree.state.loading:  # so every run sees the whole tree
+        time.sleep(0.001)
+        tree.stream()
+    listed = (time.perf_counter() - start) * 1000
+
+    def run(steps):
+        script.load(steps)
+        tree.getkeys()
+
+    def find(string):
+        # the prompt needs a real terminal, so type into search directly
+        tree.query, tree.start = None, tree.rows[tree.curline][0]
+        for i in range(1, len(string) + 1):
+            begin = time.perf_counter()
+            tree.search(string[:i])
+            script.times['find'].append(time.perf_counter() - begin)
+
+    began = time.perf_counter()
+    SCENARIOS[name](run, find, count)
+    total = (time.perf_counter() - began) * 1000
+    return {
+        'startup_ms': startup,
+        'listed_ms': listed,
+        'total_ms': total,
+        'latency': {label: percentiles(samples)
+                    for label, samples in script.times.items()},
+        'syscalls': dict(calls),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+###############################################################################
+#                             REPORTS AND BASELINES                           #
+###############################################################################
+
+def report(results):
+    for name, result in results.items():
+        print("\n{}: startup {:.1f}ms, listed {:.1f}ms, total {:.0f}ms, "
+              "peak {} KB".format(name, result['startup_ms'],
+                                  result['listed_ms'], result['total_ms'],
+                                  result['peak_rss_kb']))
+        calls = sorted(result['syscalls'].items())
+        print("  syscalls: " + ", ".join("{} {}".format(*c) for c in calls))
+        print("  {:<14}{:>6}{:>10}{:>10}{:>10}{:>10}".format(
+            'key', 'n', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+        for label, p in sorted(result['latency'].items()):
+            print("  {:<14}{:>6}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}".format(
+                label, p['n'], p['p50'], p['p90'], p['p99'], p['max']))
+
+
+def compare(results, baseline, threshold):
+    '''
+    Print every measure that is worse than the baseline by more than the
+    threshold, as a fraction, and return how many there were. Latencies are
+    compared at the 90th percentile, and differences under a tenth of a
+    millisecond are ignored as noise.
+    '''
+    worse = 0
+
+    def check(what, old, new, floor=0):
+        nonlocal worse
+        if old is None or new - old <= floor:
+            return
+        if new > old * (1 + threshold):
+            worse += 1
+            print("  {}: {:.2f} -> {:.2f} ({:+.0%})".format(
+                what, old, new, (new - old) / old if old else 1))
+
+    print("\nCompared with baseline from {}:".format(
+        baseline['meta'].get('date')))
+    for name, result in results.items():
+        old = baseline['scenarios'].get(name)
+        if old is None:
+            continue
+        check(name + ' startup ms', old['startup_ms'], result['startup_ms'],
+              0.1)
+        check(name + ' listed ms', old.get('listed_ms'), result['listed_ms'],
+              0.1)
+        check(name + ' peak KB', old['peak_rss_kb'], result['peak_rss_kb'])
+        for call, n in result['syscalls'].items():
+            check(name + ' ' + call, old['syscalls'].get(call, 0), n)
+        for label, p in result['latency'].items():
+            if label in old['latency']:
+                check(name + ' ' + label + ' p90 ms',
+                      old['latency'][label]['p90'], p['p90'], 0.1)
+    print("  {} regressions".format(worse) if worse else "  no regressions")
+    return worse
+
+
+def getargs():
+    parser = argparse.ArgumentParser(description='Benchmark treepick.')
+    parser.add_argument("-d", "--dir", default=os.path.join(
+        tempfile.gettempdir(), 'treepick-bench'),
+        help="Where to generate trees.")
+    parser.add_argument("-s", "--scale", type=float, default=1.0,
+                        help="Scale the size of every tree.")
+    parser.add_argument("-t", "--trees", default=','.join(SCENARIOS),
+                        help="Comma separated scenarios to run.")
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--cols", type=int, default=120)
+    parser.add_argument("--save", metavar="JSON",
+                        help="Save results as a baseline.")
+    parser.add_argument("--compare", metavar="JSON",
+                        help="Compare results with a saved baseline.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Fraction worse than baseline to call it a "
+                        "regression.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = getargs()
+    if args.child:
+        name, root, count = args.child.split(':', 2)
+        result = scenario(name, root, int(count), args.lines, args.cols)
+        print(json.dumps(result))
+        return
+    results = {}
+    for name in args.trees.split(','):
+        count = max(1, int(SIZES[name] * args.scale))
+        root = mktree(args.dir, name, count)
+        out = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--child',
+             '{}:{}:{}'.format(name, root, count),
+             '--lines', str(args.lines), '--cols', str(args.cols)])
+        results[name] = json.loads(out.decode())
+    report(results)
+    worse = 0
+    if args.compare:
+        with open(args.compare) as f:
+            worse = compare(results, json.load(f), args.threshold)
+    if args.save:
+        meta = {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scale': args.scale,
+        }
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'scenarios': results}, f, indent=2)
+    sys.exit(1 if worse else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,6 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/tslight/treepick",
-    install_requires=['pdu'],
     packages=setuptools.find_packages(),
     classifiers=(
         "Programming Language :: Python :: 3",
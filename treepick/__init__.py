@@ -3,5 +3,6 @@
 
 name = "treepick"
 from .__main__ import pick
+from .batch import batch
 from .paths import Paths
 from .color import Color
@@ -5,8 +5,12 @@ import argparse
 import curses
 import cgitb
 import os
+import sys
 
-from .paths import Paths
+from .batch import batch
+from .cache import Cache, clear
+from .keys import Keys
+from .watch import Watcher
 # Get more detailed traceback reports
 cgitb.enable(format="text")  # https://pymotw.com/2/cgitb/
 
@@ -32,6 +36,28 @@ def getargs():
                         help="Show all hidden paths too.")
     parser.add_argument("-r", "--relative", action="store_true",
                         help="Output relative paths.")
+    parser.add_argument("-n", "--no-cache", action="store_false",
+                        dest="cache", help="Don't use the size cache.")
+    parser.add_argument("-c", "--clear-cache", action="store_true",
+                        help="Clear the size cache before starting.")
+    parser.add_argument("-w", "--no-watch", action="store_false",
+                        dest="watch",
+                        help="Don't watch expanded directories for changes.")
+    parser.add_argument("-j", "--jobs", type=int, default=8, metavar="N",
+                        help="Read up to N directories at once.")
+    parser.add_argument("-b", "--batch", action="store_true",
+                        help="Print matching paths without a UI.")
+    parser.add_argument("-g", "--glob", action="append", default=[],
+                        dest="globs", metavar="GLOB",
+                        help="Only print paths matching GLOB in batch mode.")
+    parser.add_argument("--min-depth", type=int, default=1, metavar="N",
+                        help="Only print paths at least N levels down.")
+    parser.add_argument("--max-depth", type=int, metavar="N",
+                        help="Only print paths at most N levels down.")
+    parser.add_argument("-0", "--null", action="store_true",
+                        help="End paths with NUL instead of newline.")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Save cProfile stats for the session to FILE.")
     parser.add_argument("path", type=chkpath, nargs='?',
                         default=".", help="A valid path.")
     return parser.parse_args()
@@ -44,13 +70,46 @@ def get_picked(relative, root, picked):
         else:
             length = len(root + os.path.sep)
         return [p[length:] for p in picked]
-    return picked
+    return list(picked)
 
 
-def pick(screen, root, hidden=True, relative=False, picked=[]):
+def stream(root, globs=[], hidden=True, relative=False, mindepth=1,
+           maxdepth=None, null=False, jobs=8):
+    '''
+    Write matching paths to stdout as they are found, as bytes so names that
+    aren't valid in the locale's encoding come out just as they are on disk.
+    '''
+    if relative:
+        length = len(root.rstrip(os.path.sep) + os.path.sep)
+    else:
+        length = 0
+    end = b'\0' if null else b'\n'
+    out = sys.stdout.buffer
+    try:
+        for path in batch(root, globs, hidden, mindepth, maxdepth, jobs):
+            out.write(os.fsencode(path[length:]) + end)
+        out.flush()
+    except BrokenPipeError:
+        # reader has gone, e.g. head, so quietly stop and don't let python
+        # complain when it flushes stdout on the way out
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def pick(screen, root, hidden=True, relative=False, picked=[], cache=True,
+         watch=True, jobs=8):
     picked = [root + p for p in picked]
-    parent = Paths(screen, root, hidden, picked=picked, expanded=set([root]))
-    picked = parent.getkeys()
+    cache = Cache() if cache else None
+    watcher = Watcher() if watch else None
+    tree = Keys(screen, root, hidden, picked=picked, expanded=set([root]),
+                cache=cache, watcher=watcher, jobs=jobs)
+    try:
+        picked = tree.getkeys()
+    finally:
+        tree.close()
+        if cache is not None:
+            cache.close()
+        if watcher is not None:
+            watcher.close()
     return get_picked(relative, root, picked)
 
 
@@ -59,7 +118,24 @@ def main(picked=[]):
     root = os.path.abspath(os.path.expanduser(args.path))
     hidden = args.hidden
     relative = args.relative
-    paths = curses.wrapper(pick, root, hidden, relative)
+    if args.clear_cache:
+        clear()
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        if args.batch:
+            stream(root, args.globs, hidden, relative, args.min_depth,
+                   args.max_depth, args.null, args.jobs)
+            return
+        paths = curses.wrapper(pick, root, hidden, relative,
+                               cache=args.cache, watch=args.watch,
+                               jobs=args.jobs)
+    finally:
+        if args.profile:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
     print("\n".join(paths))
 
 
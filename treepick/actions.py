@@ -1,10 +1,23 @@
 # Copyright (c) 2018, Toby Slight. All rights reserved.
 # ISC License (ISCL) - see LICENSE file for details.
 
+import asyncio
 import os
-import fnmatch
+import time
+
+from bisect import bisect_left, bisect_right
+from itertools import islice
 
 from .draw import Draw
+from .expanded import Expanded
+from .fuzzy import Fuzzy
+from .paths import Paths, State
+from .picked import Globs, Picked
+from .search import Index
+from .watch import ENTRIES
+
+BATCH = 64  # directories, or rows, a task deals with at once
+SLICE = 0.01  # seconds a task works for before giving way to the keys
 
 
 class Actions(Draw):
@@ -14,12 +27,22 @@ class Actions(Draw):
                  hidden,
                  picked=[],
                  expanded=set(),
-                 sized=dict()):
-        Draw.__init__(self, screen, picked, expanded, sized)
-        self.name = name
-        self.hidden = hidden
+                 sized=dict(),
+                 cache=None,
+                 watcher=None,
+                 jobs=8):
+        self.state = State(hidden, picked, expanded, sized)
+        Draw.__init__(self, screen, self.state, cache, jobs)
+        self.root = Paths(name, self.state)
+        self.mkrows()
         self.globs, self.matches = (None,)*2
+        self.keys, self.query, self.start = [], None, None
+        self.fuzzy, self.fuzzyquery, self.fuzzyline = None, '', 0
         self.lastpath, self.lasthidden = (None,)*2
+        self.watcher = watcher  # of expanded directories, for changes on disk
+        self.watched = None  # version of the expanded set it last watched
+        self.tasks = []  # long actions, running one after another
+        self.failed = None  # what a task raised, for the keys to raise
 
     ###########################################################################
     #                          QUIT AND RESET METHODS                         #
@@ -28,14 +51,47 @@ class Actions(Draw):
     def quit(self):
         return True
 
+    def escape(self):
+        '''
+        Stop the task that is running, if there is one, or quit.
+        '''
+        if self.tasks:
+            self.tasks[0].cancel()
+            return False
+        return self.quit()
+
+    def close(self):
+        '''
+        Stop everything still working in the background, once we're done.
+        '''
+        self.sizes.cancel()
+        for listing in self.state.loading.values():
+            listing.stop()
+        if self.fuzzy is not None:
+            self.fuzzy.stop()
+        self.walker.shutdown()
+
     def reset_all(self):
+        for task in self.tasks:
+            task.cancel()
+        self.sizes.cancel()
+        for listing in self.state.loading.values():
+            listing.stop()
         self.curline = 0
-        self.picked = []
-        self.expanded = set([self.name])
-        self.sized = {}
+        self.state.picked = Picked()
+        self.state.expanded = Expanded([self.root.name])
+        self.state.sized = {}
+        self.state.listings = {}
+        self.state.loading = {}
+        self.state.totals = {}
+        self.state.index = Index()
+        self.matches, self.keys = None, []
+        self.root.paths = None
+        self.footed = None
+        self.mkrows()
 
     def reset_picked(self):
-        self.picked = []
+        self.state.picked = Picked()
 
     ###########################################################################
     #                          LINE MOVEMENT METHODS                          #
@@ -67,185 +123,583 @@ class Actions(Draw):
     #                           LINE JUMPING METHODS                          #
     ###########################################################################
 
-    def nextparent(self, parent, depth):
+    def nextparent(self, node, depth):
         '''
-        Add lines to current line by traversing the grandparent object again
-        and once we reach our current line counting every line that is prefixed
-        with the parent directory.
+        Jump to the row after everything beneath our parent directory, which
+        is that of the next sibling of our parent, or of the nearest ancestor
+        with one, so it's found from the tree rather than by walking the rows
+        in between.
         '''
         if depth > 1:  # can't jump to parent of root node!
-            pdir = os.path.dirname(self.name)
-            line = 0
-            for c, d in parent.traverse():
-                if line > parent.curline and c.name.startswith(pdir):
-                    parent.curline += 1
-                line += 1
+            node = node.parent
+            while node.parent is not None:
+                siblings = node.parent.paths
+                if node.index + 1 < len(siblings):
+                    self.curline = self.rowof(siblings[node.index + 1])
+                    return
+                node = node.parent
+            self.curline = self.line  # nothing after it, so wrap to the top
         else:  # otherwise just skip to next directory
-            line = -1  # skip hidden parent node
-            for c, d in parent.traverse():
-                if line > parent.curline:
-                    parent.curline += 1
-                    if os.path.isdir(c.name) and c.name in parent.children[0:]:
-                        break
-                line += 1
+            i = self.root.paths.nextdir(node.index, 1)
+            if i is None:
+                self.curline = self.line - 1
+            else:
+                self.curline = self.rowof(self.root.paths[i])
 
-    def prevparent(self, parent, depth):
+    def prevparent(self, node, depth):
         '''
-        Subtract lines from our curline if the name of a node is prefixed with
-        the parent directory when traversing the grandparent object.
+        Jump to the row of our parent directory.
         '''
-        pdir = os.path.dirname(self.name)
         if depth > 1:  # can't jump to parent of root node!
-            for c, d in parent.traverse():
-                if c.name == self.name:
-                    break
-                if c.name.startswith(pdir):
-                    parent.curline -= 1
-        else:  # otherwise jus skip to previous directory
-            pdir = self.name
-            # - 1 otherwise hidden parent node throws count off & our
-            # self.curline doesn't change!
-            line = -1
-            for c, d in parent.traverse():
-                if c.name == self.name:
-                    break
-                if os.path.isdir(c.name) and c.name in parent.children[0:]:
-                    parent.curline = line
-                line += 1
-        return pdir
+            self.curline = self.rowof(node.parent)
+        else:  # otherwise just skip to previous directory
+            i = self.root.paths.nextdir(node.index, -1)
+            if i is not None:
+                self.curline = self.rowof(self.root.paths[i])
 
     ###########################################################################
     #                       EXPAND AND COLLAPSE METHODS                       #
     ###########################################################################
 
-    def expand(self, parent):
-        self.expanded.add(self.name)
-        parent.curline += 1
-
-    def expand_all(self, parent):
-        if os.path.isdir(self.name) and self.children:
-            self.expanded.add(self.name)
-            for c, d in self.traverse():
-                if d < 2 and os.path.isdir(c.name) and c.children:
-                    self.expanded.add(c.name)
-            parent.curline += 1
-
-    def toggle_expand(self):
-        if self.name in self.expanded:
-            self.expanded.remove(self.name)
+    def expand(self, node):
+        if node.name not in self.state.expanded:
+            self.state.expanded.add(node.name)
+            self.splice(self.curline)
+        self.curline += 1
+
+    def expand_all(self, node):
+        '''
+        Expand a directory straight away, and then each of its subdirectories
+        that has children in a task, splicing in their rows as they go.
+        '''
+        if node.isdir() and node.haschildren():
+            self.state.expanded.add(node.name)
+            self.splice(self.curline)
+            self.curline += 1
+            self.spawn(self.expanding(node))
+
+    async def expanding(self, node):
+        paths, dirs = node.getpaths(), []
+        i = paths.nextdir(-1, 1) if paths else None
+        while i is not None:
+            dirs.append(paths[i])
+            i = paths.nextdir(i, 1)
+        loop = asyncio.get_running_loop()
+        for first in range(0, len(dirs), BATCH):
+            self.progress = "Expanding {} of {}".format(first, len(dirs))
+            # list a batch at once, rather than one at a time as each is
+            # probed for children below
+            batch = dirs[first:first + BATCH]
+            await loop.run_in_executor(
+                None, lambda: list(self.walker.map(Paths.scandir, batch)))
+            cursor = self.rows[self.curline][0] if self.rows else None
+            for c in batch:
+                if c.haschildren():
+                    self.state.expanded.add(c.name)
+            self.respliced(node)
+            self.settle(cursor)
+
+    def toggle_expand(self, node):
+        if node.name in self.state.expanded:
+            self.state.expanded.remove(node.name)
         else:
-            self.expanded.add(self.name)
+            self.state.expanded.add(node.name)
+        self.splice(self.curline)
 
-    def collapse(self):
-        if self.name in self.expanded:
-            self.expanded.remove(self.name)
+    def collapse(self, node):
+        if node.name in self.state.expanded:
+            self.state.expanded.remove(node.name)
+            self.splice(self.curline)
 
-    def collapse_all(self, parent, depth):
+    def collapse_all(self, node, depth):
         if depth > 1:
-            p = self.prevparent(parent, depth)
-            self.expanded.remove(p)
-            for x in list(self.expanded):  # iterate over copy
-                par = os.path.abspath(p)
-                path = os.path.abspath(x)
-                if path.startswith(par):
-                    self.expanded.remove(x)
+            self.curline = self.rowof(node.parent)
+            self.state.expanded.collapse(node.parent.name)
+            self.splice(self.curline)
         else:
-            self.collapse()
+            self.collapse(node)
 
     ###########################################################################
     #                           PATH PICKING METHODS                          #
     ###########################################################################
 
-    def pick(self, parent):
-        if self.name in self.picked:
-            self.picked.remove(self.name)
-        else:
-            self.picked.append(self.name)
-        parent.curline += 1
+    def pick(self, node):
+        self.state.picked.toggle(node.name)
+        self.curline += 1
 
     def pickall(self):
-        for c, d in self.traverse():
-            if d == 0:
-                continue
-            if c.name in self.picked:
-                self.picked.remove(c.name)
-            else:
-                self.picked.append(c.name)
+        self.spawn(self.toggling())
 
     def pickglobs(self):
-        self.globs = self.mktb("Pick: ").strip().split()
-        if self.globs:
-            for c, d in self.traverse():
-                for g in self.globs:
-                    if (fnmatch.fnmatch(c.name, g) or
-                            fnmatch.fnmatch(os.path.basename(c.name), g)):
-                        if c.name in self.picked:
-                            self.picked.remove(c.name)
-                        else:
-                            self.picked.append(c.name)
+        globs = self.mktb("Pick: ").strip().split()
+        if globs:
+            self.globs = Globs(globs)
+            self.spawn(self.toggling(self.globs))
+
+    async def toggling(self, globs=None):
+        '''
+        Toggle picking of every row, or just those matching globs, as they
+        were when we started.
+        '''
+        picked = self.state.picked
+        async for paths in self.slices(self.rows.paths(), "Picking",
+                                       len(self.rows)):
+            for path in paths:
+                if globs is None or globs.match(path):
+                    picked.toggle(path)
+
+    def pickdeep(self):
+        '''
+        Pick everything beneath the directory under the cursor that matches
+        the entered globs, whether it has been expanded or not, skipping
+        directories that can't contain a match.
+        '''
+        globs = self.mktb("Pick beneath: ").strip().split()
+        if globs and self.rows:
+            self.globs = Globs(globs)
+            node = self.rows[self.curline][0]
+            if node.isdir():
+                top = node.name
+            else:
+                top = os.path.dirname(node.name)
+            self.spawn(self.picking(top, self.globs))
+
+    async def picking(self, top, globs):
+        walk = self.walker.walk(top, self.state.hidden, globs.viable)
+        loop = asyncio.get_running_loop()
+        picked, found, seen = self.state.picked, 0, 0
+        while True:
+            # the walk waits on its reads, so is moved along in a thread
+            batch = await loop.run_in_executor(
+                None, lambda: list(islice(walk, BATCH * 16)))
+            if not batch:
+                break
+            for entry, depth in batch:
+                if globs.match(entry.path):
+                    picked.append(entry.path)
+                    found += 1
+            seen += len(batch)
+            self.progress = "Picked {} of {} beneath {}".format(
+                found, seen, os.path.basename(top))
 
     ###########################################################################
     #                            SEARCHING METHODS                            #
     ###########################################################################
 
     def find(self):
-        string = self.mktb("Find: ").strip()
+        '''
+        Search the basenames of every node loaded so far as the user types,
+        moving to the first visible match after where the search started.
+        '''
+        if not self.rows:
+            return
+        self.query, self.start = None, self.rows[self.curline][0]
+        string = self.mktb("Find: ", self.search).strip()
         if string:
-            self.matches = []
-            line = -1
-            for c, d in self.traverse():
-                if string in os.path.basename(c.name):
-                    self.matches.append(line)
-                line += 1
-            if self.matches:
-                self.findnext()
+            self.search(string)
+        else:
+            self.curline = self.rowof(self.start)
+
+    def search(self, string):
+        if not string:
+            self.query = None
+            self.curline = self.rowof(self.start)
+        else:
+            if self.query and self.query in string:
+                # typing on the end only narrows what we already have
+                found = [(k, c, i) for k, (c, i) in
+                         zip(self.keys, self.matches)
+                         if string in c.entries.names[i]]
+            else:
+                found = self.state.index.find(string)
+            self.keys = [k for k, c, i in found]
+            self.matches = [(c, i) for k, c, i in found]
+            self.query = string
+            if not self.seek(self.start.key(), 1):
+                self.curline = self.rowof(self.start)
+        self.drawtree(footer=False)
+
+    def seek(self, key, step):
+        '''
+        Move to the nearest visible match after (or before if step is negative)
+        the given position in the tree, wrapping around at either end. Only
+        the node moved to is made.
+        '''
+        if not self.matches:
+            return False
+        if step > 0:
+            first = bisect_right(self.keys, key)
+        else:
+            first = bisect_left(self.keys, key) - 1
+        for n in range(len(self.matches)):
+            children, i = self.matches[(first + n * step) % len(self.matches)]
+            parent = children.parent
+            if parent.name in self.state.expanded and parent.isvisible():
+                self.curline = self.rowof(children[i])
+                return True
+        return False
 
     def findnext(self):
-        for m in range(len(self.matches)):
-            if self.curline == self.matches[len(self.matches) - 1]:
-                self.curline = self.matches[0]
-                break
-            elif self.curline < self.matches[m]:
-                self.curline = self.matches[m]
-                break
+        if self.rows:
+            self.seek(self.rows[self.curline][0].key(), 1)
 
     def findprev(self):
-        for m in range(len(self.matches)):
-            if self.curline <= self.matches[m]:
-                self.curline = self.matches[m-1]
-                break
+        if self.rows:
+            self.seek(self.rows[self.curline][0].key(), -1)
+
+    ###########################################################################
+    #                          FUZZY FINDING METHODS                          #
+    ###########################################################################
+
+    def mkfuzzy(self):
+        '''
+        Start crawling beneath the root the first time we're asked, or again
+        if the crawl we have was made with different hidden settings.
+        '''
+        if self.fuzzy is None or self.fuzzy.hidden != self.state.hidden:
+            if self.fuzzy is not None:
+                self.fuzzy.stop()
+            self.fuzzy = Fuzzy(self.root.name, self.state.hidden,
+                               walker=self.walker)
+            self.fuzzyquery = ''
+        self.fuzzyline = 0
+
+    def fuzzy_add(self, char):
+        self.fuzzyquery += char
+        self.fuzzy.search(self.fuzzyquery)
+        self.fuzzyline = 0
+
+    def fuzzy_del(self):
+        self.fuzzyquery = self.fuzzyquery[:-1]
+        self.fuzzy.search(self.fuzzyquery)
+        self.fuzzyline = 0
+
+    def fuzzy_dn(self):
+        self.fuzzyline += 1
+
+    def fuzzy_up(self):
+        if self.fuzzyline > 0:
+            self.fuzzyline -= 1
+
+    def fuzzy_pick(self):
+        results = self.fuzzy.results()
+        if results:
+            line = min(self.fuzzyline, len(results) - 1)
+            self.reveal(results[line][1])
+        return True
+
+    def reveal(self, path):
+        '''
+        Expand every directory on the way to a path relative to the root, and
+        move to it.
+        '''
+        node = self.root
+        for name in path.split(os.sep):
+            child = node.child(name)
+            if child is None:
+                break  # gone, or hidden, since it was crawled
+            if node.name not in self.state.expanded:
+                self.state.expanded.add(node.name)
+                self.splice(self.rowof(node))
+            node = child
+        if node is not self.root:
+            self.curline = self.rowof(node)
 
     ###########################################################################
     #                         SIZE AND HIDING METHODS                         #
     ###########################################################################
 
-    def getsize(self, parent):
-        self.sized[os.path.abspath(self.name)] = None
-        parent.curline += 1
+    def getsize(self, node):
+        self.state.sized[node.name] = None
+        self.curline += 1
 
     def getsizeall(self):
-        for c, d in self.traverse():
-            self.sized[os.path.abspath(c.name)] = None
+        self.spawn(self.sizing())
+
+    async def sizing(self):
+        '''
+        Size every row in the background, and wait for them all to be done,
+        forgetting those that aren't if we're stopped.
+        '''
+        sized, pending = self.state.sized, []
+        try:
+            # children before parents, so parents can add up their totals
+            async for rows in self.slices(reversed(self.rows), "Queueing",
+                                          len(self.rows)):
+                for c, d in rows:
+                    sized[c.name] = None
+                    self.sizes.submit(c, 1)
+                    pending.append(c.name)
+            total = len(pending)
+            while pending:
+                self.progress = "Sized {} of {}".format(
+                    total - len(pending), total)
+                await asyncio.sleep(0.1)
+                pending = [p for p in pending if sized.get(p, '') is None]
+        except asyncio.CancelledError:
+            self.sizes.cancel()
+            for path in pending:
+                if sized.get(path, '') is None:
+                    del sized[path]
+            raise
 
     def toggle_hidden(self):
-        self.paths = None
+        if not self.rows:
+            name = None
+        else:
+            name = self.rows[self.curline][0].name
 
-        if self.hidden:
+        if self.state.hidden:
             # keep two copies of record so we can restore from state when
             # re-hiding
-            self.lastpath = self.children[self.curline]
-            self.hidden = False
+            self.lastpath = name
+            self.state.hidden = False
         else:
             # keep two copies of record so we can restore from state
-            self.lasthidden = self.children[self.curline]
-            self.hidden = True
+            self.lasthidden = name
+            self.state.hidden = True
+
+        self.root.paths = None
+        self.state.index = Index()
+        self.matches, self.keys = None, []
+        self.footed = None
+        self.mkrows()
+
+        names = list(self.rows.paths())
+        if self.lasthidden in names:
+            self.curline = names.index(self.lasthidden)
+        elif self.lastpath in names:
+            self.curline = names.index(self.lastpath)
+        else:
+            self.curline = 0
+
+    ###########################################################################
+    #                         CHANGES ON DISK METHODS                         #
+    ###########################################################################
+
+    def locate(self, path):
+        '''
+        Return the node for a path if it has been loaded, without loading any
+        more of the tree to find it.
+        '''
+        node = self.root
+        relpath = os.path.relpath(path, self.root.name)
+        if relpath == os.curdir:
+            return node
+        for name in relpath.split(os.sep):
+            if node.paths is None:
+                return None
+            node = node.child(name)
+            if node is None:
+                return None
+        return node
+
+    def unsize(self, path, names):
+        '''
+        Forget the sizes of the changed names in a directory, and of the
+        directory and everything above it, so they are worked out again.
+        '''
+        sized, totals = self.state.sized, self.state.totals
+        for name in names:
+            totals.pop(os.path.join(path, name), None)
+            if sized.get(os.path.join(path, name)) is not None:
+                sized[os.path.join(path, name)] = None
+        if self.sizes.cache is not None:
+            try:
+                self.sizes.cache.forget(os.stat(path))
+            except OSError:
+                pass
+        while True:
+            totals.pop(path, None)
+            if sized.get(path) is not None:
+                sized[path] = None
+            if path == self.root.name or path == os.path.dirname(path):
+                break
+            path = os.path.dirname(path)
+
+    def forget(self, paths):
+        '''
+        Drop everything we know about paths that have gone from disk, and
+        everything beneath them.
+        '''
+        paths = set(paths)
+        beneath = tuple(p + os.sep for p in paths)
+
+        def gone(path):
+            return path in paths or path.startswith(beneath)
+
+        state = self.state
+        for path in paths:
+            state.expanded.collapse(path)
+        with state.lock:  # sizing and listing ahead add to these meanwhile
+            for d in (state.sized, state.totals, state.listings):
+                for path in [p for p in d if gone(p)]:
+                    del d[path]
+        state.index.discard(paths)
+        if self.matches is not None:
+            self.matches = [(c, i) for c, i in self.matches
+                            if not gone(c.path(i))]
+
+    def rescan(self):
+        '''
+        Patch in whatever has changed on disk in the expanded directories,
+        listing again only the directories that entries were added to or
+        removed from, and splicing only their rows. Files that were just
+        written to only need sizing again. Returns True if anything had
+        changed.
+        '''
+        if self.watcher is None:
+            return False
+        expanded = self.state.expanded
+        if self.watched != expanded.version:
+            self.watcher.sync(expanded)
+            self.watched = expanded.version
+        changes = self.watcher.read()
+        if not changes:
+            return False
+        cursor = self.rows[self.curline][0] if self.rows else None
+        # parents first, so their children are found where they are now
+        for path in sorted(changes, key=lambda p: p.count(os.sep)):
+            self.unsize(path, changes[path])
+            if not any(mask & ENTRIES for mask in changes[path].values()):
+                continue
+            node = self.locate(path)
+            if node is None or node.paths is None:
+                continue  # not loaded, so nothing to patch
+            self.forget(node.reload())
+            self.respliced(node)
+        self.settle(cursor)
+        return True
+
+    def stream(self):
+        '''
+        Patch in whatever more has been read of the directories being listed
+        in the background, splicing only their rows. Returns True if anything
+        had been read.
+        '''
+        state = self.state
+        grown = []
+        for path, listing in list(state.loading.items()):
+            if path in state.listings:  # listed in full in the meantime
+                listing.stop()
+                del state.loading[path]
+            elif listing.done:
+                state.listings[path] = listing.entries
+                del state.loading[path]
+            elif listing.whole or not listing.take():
+                continue
+            grown.append(path)
+        if not grown:
+            return False
+        cursor = self.rows[self.curline][0] if self.rows else None
+        for path in sorted(grown, key=lambda p: p.count(os.sep)):
+            node = self.locate(path)
+            if node is None or node.paths is None:
+                continue  # not loaded, so nothing to patch
+            self.forget(node.update(node.shown(node.scandir(stream=True))))
+            self.respliced(node)
+        self.settle(cursor)
+        return True
+
+    def respliced(self, node):
+        '''
+        Splice the rows beneath a node whose children have changed, if they're
+        showing.
+        '''
+        if node is self.root:
+            self.mkrows()
+        elif node.name in self.state.expanded and node.isvisible():
+            row = self.rowof(node)
+            if row < self.line and self.rows[row][0] is node:
+                self.splice(row)
+
+    def settle(self, cursor):
+        '''
+        Put the cursor back on the node it was on before the rows changed, or
+        as near to where it was as we can if that has gone.
+        '''
+        if self.matches is not None:
+            self.rematch()
+        self.footed = None  # the stat or children under the cursor may differ
+        if cursor is not None:
+            row = self.rowof(cursor)
+            if row < self.line and self.rows[row][0] is cursor:
+                self.curline = row
+            else:
+                self.curline = min(self.curline, max(self.line - 1, 0))
 
-        self.drawtree()
+    def rematch(self):
+        '''
+        Find the search matches again in the new children of directories that
+        have been listed again, and work out their keys afresh.
+        '''
+        matches, keys, parents = [], [], {}
+        for children, i in self.matches:
+            parent = children.parent
+            if parent.paths is not children:
+                name = children.entries.names[i]
+                children = parent.paths
+                i = None if children is None else children.find(name)
+                if i is None:
+                    continue
+            if parent.name not in parents:
+                parents[parent.name] = parent.key()
+            matches.append((children, i))
+            keys.append(parents[parent.name] + [i])
+        self.matches, self.keys = matches, keys
+
+    def toggle_meter(self):
+        self.meter.toggle()
+        self.footed = None
 
-        if self.lasthidden in self.children:
-            self.curline = self.children.index(self.lasthidden)
-        elif self.lastpath in self.children:
-            self.curline = self.children.index(self.lastpath)
+    ###########################################################################
+    #                              TASK METHODS                               #
+    ###########################################################################
+
+    def spawn(self, work):
+        '''
+        Run a coroutine as a task alongside the keys, once those started
+        before it have finished. Its progress is shown in the footer, and ESC
+        stops it.
+        '''
+        task = asyncio.ensure_future(
+            self.after(self.tasks[-1] if self.tasks else None, work))
+        # in case it was stopped before it got to start
+        task.add_done_callback(lambda task: work.close())
+        task.add_done_callback(self.finished)
+        self.tasks.append(task)
+
+    async def after(self, previous, work):
+        if previous is not None:
+            await asyncio.wait([previous])
+        await work
+
+    def finished(self, task):
+        self.tasks.remove(task)
+        self.progress = None
+        self.footed = None
+        if not task.cancelled() and task.exception() is not None:
+            # so it ends us just as it would have run straight from its key,
+            # rather than being lost
+            self.failed = task.exception()
+
+    async def slices(self, items, label, total):
+        '''
+        Async generator of lists of BATCH items, that gives the keys a turn
+        every SLICE seconds, showing how far through them it is in the footer.
+        '''
+        items, done = iter(items), 0
+        deadline = time.monotonic() + SLICE
+        while True:
+            batch = list(islice(items, BATCH))
+            if not batch:
+                return
+            yield batch
+            done += len(batch)
+            if time.monotonic() > deadline:
+                self.progress = "{} {} of {}".format(label, done, total)
+                await asyncio.sleep(0)
+                deadline = time.monotonic() + SLICE
 
     ###########################################################################
     #                           PAD MOVEMENT METHODS                          #
@@ -0,0 +1,38 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import os
+
+from .picked import Globs
+from .walk import Walker
+
+
+def batch(root, globs=[], hidden=True, mindepth=1, maxdepth=None, jobs=8):
+    '''
+    Generator that streams the paths beneath root that match any of the
+    globs, just as they would be picked with ; in the tree, or every path if
+    there are no globs. Only paths between mindepth and maxdepth are yielded,
+    where root's children are at depth one. Directories below maxdepth, and
+    those that can't contain a match, aren't entered at all, and nothing is
+    held on to beyond the listings of the directories part way through, and
+    those of the next few directories, which are read ahead by jobs threads.
+    '''
+    globs = Globs(globs) if globs else None
+    length = len(root.rstrip(os.sep) + os.sep)
+
+    def descend(path):
+        depth = path[length:].count(os.sep) + 1
+        if maxdepth is not None and depth >= maxdepth:
+            return False
+        return globs is None or globs.viable(path)
+
+    walker = Walker(jobs)
+    try:
+        for entry, depth in walker.walk(root, hidden, descend):
+            # root's children are walked whatever the depths, so check both
+            if (depth >= mindepth and
+                    (maxdepth is None or depth <= maxdepth) and
+                    (globs is None or globs.match(entry.path))):
+                yield entry.path
+    finally:
+        walker.shutdown()
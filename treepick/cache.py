@@ -0,0 +1,171 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import os
+import threading
+import time
+
+try:
+    import sqlite3
+except ImportError:  # python built without sqlite, so run without a cache
+    sqlite3 = None
+
+
+def cachepath():
+    '''
+    Return the path to the cache database under $XDG_CACHE_HOME.
+    '''
+    home = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(home, 'treepick', 'sizes.db')
+
+
+def clear(path=None):
+    '''
+    Delete the cache database, if there is one.
+    '''
+    try:
+        os.remove(path or cachepath())
+    except FileNotFoundError:
+        pass
+
+
+class Cache:
+    '''
+    Persistent cache of what each directory directly contains - the number
+    and bytes of its files and the names of its subdirectories - keyed by
+    device and inode and only trusted while the directory's mtime matches.
+
+    Since a directory's mtime only changes when entries are added, removed or
+    renamed, files that grow in place are not noticed until then. Once it
+    holds more than limit directories, the least recently used are evicted.
+    '''
+    def __init__(self, path=None, limit=250000):
+        self.path = path or cachepath()
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.pending, self.used = {}, {}
+        # keys of rows found out of date, so putting them replaces rather than
+        # adds a row, and how many rows there are, so it needn't be counted
+        self.stale, self.count = set(), 0
+        self.db = None
+        if sqlite3 is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.db = sqlite3.connect(self.path, timeout=5,
+                                      check_same_thread=False)
+            self.db.execute('''
+                CREATE TABLE IF NOT EXISTS dirs (
+                    dev INTEGER, ino INTEGER, mtime INTEGER, files INTEGER,
+                    bytes INTEGER, subdirs TEXT, used REAL,
+                    PRIMARY KEY (dev, ino))''')
+            self.db.execute('CREATE INDEX IF NOT EXISTS lru ON dirs (used)')
+            self.db.commit()
+            self.count = self.db.execute(
+                'SELECT COUNT(*) FROM dirs').fetchone()[0]
+        except (OSError, sqlite3.Error):
+            self.db = None  # unwritable or corrupt, so do without
+
+    def get(self, st):
+        '''
+        Return (files, bytes, subdirectory names) for the directory with the
+        given stat result, or None if we don't have it or it has changed.
+        '''
+        key = (st.st_dev, st.st_ino)
+        with self.lock:
+            if key in self.pending:
+                row = self.pending[key]
+            elif self.db is None:
+                return None
+            else:
+                try:
+                    row = self.db.execute(
+                        'SELECT mtime, files, bytes, subdirs FROM dirs '
+                        'WHERE dev = ? AND ino = ?', key).fetchone()
+                except sqlite3.Error:
+                    return None
+            if row is None:
+                return None
+            if row[0] != st.st_mtime_ns:
+                self.stale.add(key)
+                return None
+            self.used[key] = time.time()
+        subdirs = row[3].split('\0') if row[3] else []
+        return row[1], row[2], subdirs
+
+    def put(self, st, files, bytes_, subdirs):
+        '''
+        Remember what a directory directly contains, until the next flush.
+        '''
+        subdirs = '\0'.join(subdirs)
+        try:
+            subdirs.encode('utf-8')
+        except UnicodeEncodeError:
+            return  # undecodable names can't be stored as text
+        with self.lock:
+            if self.db is not None:
+                key = (st.st_dev, st.st_ino)
+                self.pending[key] = (st.st_mtime_ns, files, bytes_, subdirs)
+
+    def flush(self):
+        '''
+        Write out everything we've learnt and when entries were last used in
+        a single transaction, then evict the least recently used entries if
+        we have grown past our limit. The rows are counted as they're added
+        rather than asked for, so another session's may be missed until the
+        next start.
+        '''
+        with self.lock:
+            if self.db is None or not (self.pending or self.used):
+                return
+            now = time.time()
+            count = self.count + len(self.pending.keys() - self.stale)
+            try:
+                with self.db:
+                    self.db.executemany(
+                        'INSERT OR REPLACE INTO dirs VALUES (?,?,?,?,?,?,?)',
+                        [key + row + (now,)
+                         for key, row in self.pending.items()])
+                    self.db.executemany(
+                        'UPDATE dirs SET used = ? WHERE dev = ? AND ino = ?',
+                        [(used,) + key for key, used in self.used.items()])
+                    if count > self.limit:
+                        self.db.execute(
+                            'DELETE FROM dirs WHERE rowid IN (SELECT rowid '
+                            'FROM dirs ORDER BY used LIMIT ?)',
+                            (count - self.limit,))
+                        count = self.limit
+            except sqlite3.Error:
+                pass  # probably locked by another session, try next time
+            else:
+                self.pending, self.used, self.stale = {}, {}, set()
+                self.count = count
+
+    def forget(self, st):
+        '''
+        Drop what we know about the directory with the given stat result, for
+        when a file in it has changed without its mtime changing.
+        '''
+        key = (st.st_dev, st.st_ino)
+        with self.lock:
+            self.pending.pop(key, None)
+            self.used.pop(key, None)
+            if self.db is None:
+                return
+            try:
+                with self.db:
+                    deleted = self.db.execute(
+                        'DELETE FROM dirs WHERE dev = ? AND ino = ?',
+                        key).rowcount
+            except sqlite3.Error:
+                pass
+            else:
+                self.count -= deleted
+                self.stale.discard(key)
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
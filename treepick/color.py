@@ -2,7 +2,6 @@
 # ISC License (ISCL) - see LICENSE file for details.
 
 import curses
-import fnmatch
 import os
 
 
@@ -41,22 +40,16 @@ class Color:
     def curline(self, path, picked):
         # can't use "in", as we have to catch all descendants.
         self.white_blue()
-        for p in picked:
-            if (p == path or
-                path.startswith(p + os.sep) or
-                    fnmatch.fnmatch(path, p) or
-                    fnmatch.fnmatch(os.path.basename(path), p)):
-                self.black_yellow()
-
-    def default(self, path, picked):
+        if picked.covers(path):
+            self.black_yellow()
+
+    def default(self, path, picked, isdir=None):
         # can't use "in", as we have to catch all descendants.
-        if os.path.isdir(path):
+        if isdir is None:
+            isdir = os.path.isdir(path)
+        if isdir:
             self.blue_black()
         else:
             self.reset()
-        for p in picked:
-            if (p == path or
-                path.startswith(p + os.sep) or
-                    fnmatch.fnmatch(path, p) or
-                    fnmatch.fnmatch(os.path.basename(path), p)):
-                self.yellow_black()
+        if picked.covers(path):
+            self.yellow_black()
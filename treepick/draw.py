@@ -1,90 +1,192 @@
 # Copyright (c) 2018, Toby Slight. All rights reserved.
 # ISC License (ISCL) - see LICENSE file for details.
 
-import os
 import curses
 
-from pdu import du
+from .rows import Rows
 from .screen import Screen
+from .sizes import Sizes
+from .walk import Walker
 
 
 class Draw(Screen):
-    def __init__(self, screen, picked, expanded, sized):
-        Screen.__init__(self, screen, picked)
-        self.expanded = expanded
-        self.sized = sized
+    def __init__(self, screen, state, cache=None, jobs=8):
+        Screen.__init__(self, screen, state)
         self.curline = 0
         self.line = 0
+        self.rows = Rows()
+        self.walker = Walker(jobs)  # shared by everything that reads in bulk
+        self.sizes = Sizes(cache=cache, walker=self.walker)
+        self.waiting = False  # for sizes of rows on screen
 
-    def getnode(self):
-        if not os.path.isdir(self.name):
-            return '    ' + os.path.basename(self.name)
-        elif self.name in self.expanded:
-            return '[-] ' + os.path.basename(self.name) + '/'
-        elif self.getpaths():
-            return '[+] ' + os.path.basename(self.name) + '/'
-        elif self.children is None:
-            return '[?] ' + os.path.basename(self.name) + '/'
+    def mkrows(self):
+        '''
+        Build the flat index of visible (node, depth) rows from scratch. Only
+        needed when the whole tree changes - otherwise use splice.
+        '''
+        self.rows = Rows(self.root.runs())
+        self.line = len(self.rows)
+
+    def splice(self, row):
+        '''
+        Replace the rows beneath the node on the given row with its currently
+        visible descendants, leaving the rest of the index untouched.
+        '''
+        node, depth = self.rows[row]
+        self.rows.splice(row, node.runs(depth + 1))
+        self.line = len(self.rows)
+
+    def rowof(self, node):
+        '''
+        Binary search the rows for a visible node, as they are in tree order.
+        '''
+        return self.rows.row(node.key())
+
+    def getnode(self, node):
+        if not node.isdir():
+            return '    ' + node.basename
+        elif node.name in self.state.expanded:
+            return '[-] ' + node.basename + '/'
+        elif node.haschildren():
+            return '[+] ' + node.basename + '/'
+        elif node.haschildren() is None:
+            return '[?] ' + node.basename + '/'
         else:
-            return '[ ] ' + os.path.basename(self.name) + '/'
+            return '[ ] ' + node.basename + '/'
 
-    def mkline(self, depth, width):
+    def mkline(self, node, depth, width):
         pad = ' ' * 4 * depth
-        path = self.getnode()
-        node = pad + path
-        if os.path.abspath(self.name) in self.sized:
-            size = self.sized[os.path.abspath(self.name)]
-        else:
+        path = self.getnode(node)
+        line = pad + path
+        if node.name not in self.state.sized:
             size = ''
-        if self.name in self.picked:
+        elif self.state.sized[node.name] is None:
+            size = ' [...]'  # still being worked out in the background
+        else:
+            size = self.state.sized[node.name]
+        if node.name in self.state.picked:
             mark = ' *'
         else:
             mark = '  '
-        node = node + mark
+        line = line + mark
         sizelen = len(size)
         sizepad = width - sizelen
-        nodestr = '{:<{w}}{:>}'.format(node, size, w=sizepad)
+        nodestr = '{:<{w}}{:>}'.format(line, size, w=sizepad)
         return sizelen, sizepad, nodestr + ' ' * (width - len(nodestr))
 
-    def drawline(self, depth, line, win):
-        max_y, max_x = win.getmaxyx()
-        offset = max(0, self.curline - max_y + 3)
-        y = line - offset
-        x = 0
-        sizelen, sizepad, string = self.mkline(depth - 1, max_x)
-        if 0 <= line - offset < max_y - 1:
+    def drawline(self, y, line, node, depth, win):
+        '''
+        Paint the line for a node on a row at y, unless it would come out just
+        the same as what is already painted there. True if it was painted.
+        '''
+        sizelen, sizepad, string = self.mkline(node, depth - 1,
+                                               win.getmaxyx()[1])
+        current = line == self.curline
+        painted = (string, current, self.state.picked.covers(node.name))
+        if self.painted[y] == painted:
+            return False
+        self.painted[y] = painted
+        if current:
+            self.color.curline(node.name, self.state.picked)
+        else:
+            self.color.default(node.name, self.state.picked, node.isdir())
+        try:
+            win.addstr(y, 0, string)  # paint str at y, x co-ordinates
+            if sizelen > 0 and not current:
+                win.chgat(y, sizepad, sizelen,
+                          curses.A_BOLD | curses.color_pair(5))
+        except curses.error:
+            pass
+        return True
+
+    def drawfuzzy(self):
+        '''
+        Draw the best fuzzy finder results so far, with the query being typed
+        in the footer.
+        '''
+        self.win.erase()
+        max_y, max_x = self.win.getmaxyx()
+        results = self.fuzzy.results()[:max_y - 1]
+        self.fuzzyline = min(self.fuzzyline, max(len(results) - 1, 0))
+        for line, (score, path) in enumerate(results):
+            if line == self.fuzzyline:
+                self.color.white_blue()
+            else:
+                self.color.reset()
             try:
-                win.addstr(y, x, string)  # paint str at y, x co-ordinates
-                if sizelen > 0 and line != self.curline:
-                    win.chgat(y, sizepad, sizelen,
-                              curses.A_BOLD | curses.color_pair(5))
+                self.win.addstr(line, 0, '{:<{w}}'.format(path[:max_x - 1],
+                                                          w=max_x - 1))
             except curses.error:
                 pass
+        self.color.reset()
+        self.damage()  # so the tree is painted afresh afterwards
+        self.win.noutrefresh()
+        self.mkheader(self.root.name)
+        if self.fuzzy.done:
+            status = " [{}]".format(self.fuzzy.crawled)
+        else:
+            status = " [{}...]".format(self.fuzzy.crawled)
+        self.mkprompt("Fuzzy: ", self.fuzzyquery, status)
+        curses.doupdate()
 
-    def drawtree(self):
+    def listed(self, node):
         '''
-        Loop over the object, process path attribute sets, and drawlines based
-        on their current contents.
+        Return the children of a node for the footer to count, but only if
+        it has been listed already, as a directory is only listed once it's
+        expanded. None if it hasn't, and we don't know it's empty.
         '''
-        self.win.erase()
-        self.line = 0
-        for child, depth in self.traverse():
-            child.curline = self.curline
-            child.picked = self.picked
-            child.expanded = self.expanded
-            child.sized = self.sized
-            if depth == 0:
+        if not node.isdir():
+            return ()
+        if node.paths is not None:
+            return node.paths
+        if node.name in self.state.listings:
+            return node.listdir()
+        if node.probed and node.probe is False:
+            return ()
+        return None
+
+    def drawtree(self, footer=True):
+        '''
+        Draw only the rows that fit in the window, so the cost of a redraw
+        depends on the height of the terminal rather than the size of the tree.
+        Only lines that would come out differently from what they show now are
+        painted again, unless we've scrolled, been resized or been drawn over,
+        and every window is sent to the terminal in a single update.
+        '''
+        max_y, max_x = self.win.getmaxyx()
+        offset = max(0, self.curline - max_y + 3)
+        if (self.painted is None or offset != self.offset or
+                len(self.painted) != max_y - 1):
+            self.win.erase()
+            self.painted = [None] * (max_y - 1)  # None for a blank line
+            self.offset = offset
+        sized = self.state.sized
+        self.waiting = False
+        rows = self.rows.since(offset)
+        for y in range(max_y - 1):
+            line = offset + y
+            if line >= self.line:
+                if self.painted[y] is not None:
+                    self.win.move(y, 0)
+                    self.win.clrtoeol()
+                    self.painted[y] = None
                 continue
-            if self.line == self.curline:
-                self.color.curline(child.name, child.picked)
-                children = child.children
-                name = child.name
-            else:
-                self.color.default(child.name, child.picked)
-            if child.name in self.sized and not self.sized[child.name]:
-                self.sized[child.name] = " [" + du(child.name) + "]"
-            child.drawline(depth, self.line, self.win)
-            self.line += 1
-        self.win.refresh()
-        self.mkheader(name)
-        self.mkfooter(name, children)
+            child, depth = next(rows)
+            if child.name in sized and sized[child.name] is None:
+                self.sizes.submit(child, 0)  # on screen first
+                self.waiting = True
+            self.drawline(y, line, child, depth, self.win)
+        self.win.noutrefresh()
+        if 0 <= self.curline < self.line:
+            node = self.rows[self.curline][0]
+        else:
+            node = self.root
+        # header and footer only change when the cursor moves to another node
+        if node is not self.headed:
+            self.mkheader(node.name)
+            self.headed = node
+        if footer and (node is not self.footed or self.meter.on or
+                       self.progress is not None):
+            self.mkfooter(node.name, self.listed(node), node.stat())
+            self.footed = node
+        curses.doupdate()
@@ -0,0 +1,91 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import itertools
+import os
+
+VERSIONS = itertools.count()  # shared, so no two sets ever have the same
+
+
+class Expanded(set):
+    '''
+    The set of expanded directories, that also keeps them as a tree of
+    basenames under the path of the directory they're in, so the expanded
+    children of a directory, or everything expanded beneath it, are found
+    without going through every path in the set. A directory stays expanded
+    when one above it is collapsed, so it's still open when that is expanded
+    again, which is why the tree also holds the directories on the way to
+    one that's expanded. Only add, remove, discard and collapse keep the tree
+    in step, so it mustn't be changed any other way. They also bump version,
+    so whoever needs to can tell when the set has changed without comparing.
+    '''
+    def __init__(self, paths=()):
+        set.__init__(self)
+        # directory path to the basenames in it that are expanded, or have
+        # something expanded beneath them
+        self.children = {}
+        self.version = next(VERSIONS)
+        for path in paths:
+            self.add(path)
+
+    def add(self, path):
+        if path in self:
+            return
+        set.add(self, path)
+        self.version = next(VERSIONS)
+        while True:
+            parent, name = os.path.split(path)
+            if not name:  # the root of the filesystem
+                return
+            names = self.children.setdefault(parent, set())
+            if name in names:
+                return  # and so is everything above
+            names.add(name)
+            path = parent
+
+    def remove(self, path):
+        set.remove(self, path)
+        self.version = next(VERSIONS)
+        self.prune(path)
+
+    def discard(self, path):
+        if path in self:
+            self.remove(path)
+
+    def prune(self, path):
+        '''
+        Take path out of the tree, along with the directories above it that
+        only led to it, if nothing at or beneath it is expanded any more.
+        '''
+        while path not in self and path not in self.children:
+            parent, name = os.path.split(path)
+            names = self.children.get(parent)
+            if not name or names is None:
+                return
+            names.discard(name)
+            if names:
+                return
+            del self.children[parent]
+            path = parent
+
+    def names(self, path):
+        '''
+        Return the basenames of the directories expanded directly in path.
+        '''
+        prefix = os.path.join(path, '')
+        return [name for name in self.children.get(path, ())
+                if prefix + name in self]
+
+    def collapse(self, path):
+        '''
+        Collapse path and everything expanded beneath it, in time that only
+        depends on how much is expanded beneath it.
+        '''
+        self.version = next(VERSIONS)
+        stack = [path]
+        while stack:
+            parent = stack.pop()
+            set.discard(self, parent)
+            for name in self.children.pop(parent, ()):
+                stack.append(os.path.join(parent, name))
+        self.prune(path)
@@ -0,0 +1,180 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import heapq
+import os
+import re
+import threading
+
+from array import array
+from .walk import Walker
+
+BOUNDARIES = '/_-. '
+
+
+def subsequence(query):
+    '''
+    Return a pattern that finds query as a subsequence, ignoring case unless
+    the query has capitals in it.
+    '''
+    flags = 0 if query != query.lower() else re.IGNORECASE
+    return re.compile('.*?'.join(re.escape(c) for c in query), flags)
+
+
+def score(query, path, pattern):
+    '''
+    Score a path against a query in the style of fzf, or return None if the
+    query isn't a subsequence of it. Matched characters score more at the
+    start of a word and when they follow another match, while gaps between
+    them cost a little, and matches inside the basename get a bonus.
+    '''
+    match = pattern.search(path)
+    if match is None:
+        return None
+    text = path.lower() if pattern.flags & re.IGNORECASE else path
+    if pattern.flags & re.IGNORECASE:
+        query = query.lower()
+    # walk back from the end of the first match to find the tightest one
+    start, q = match.end() - 1, len(query) - 1
+    while q >= 0:
+        if text[start] == query[q]:
+            q -= 1
+        start -= 1
+    start += 1
+    total, q, consecutive = 0, 0, False
+    for i in range(start, match.end()):
+        if q < len(query) and text[i] == query[q]:
+            bonus = 16
+            if i == 0 or text[i - 1] in BOUNDARIES:
+                bonus += 8 if q else 16
+            if consecutive:
+                bonus += 4
+            total += bonus
+            q += 1
+            consecutive = True
+        else:
+            total -= 3 if consecutive else 1
+            consecutive = False
+    if start > path.rfind('/'):
+        total += 8
+    return total
+
+
+class Fuzzy:
+    '''
+    Crawls everything beneath root in a background thread, ranking paths
+    against the current query as they turn up, and keeping only the best
+    of them. Paths found are remembered compactly, as the index of their
+    directory and their basename, so a new query can be answered without
+    crawling again. Past limit paths nothing more is remembered and a new
+    query crawls again, skipping over the paths it does remember.
+    '''
+    def __init__(self, root, hidden=True, limit=1000000, best=1000,
+                 walker=None):
+        self.root = root
+        self.walker = walker or Walker(1)
+        self.hidden = hidden
+        self.limit = limit
+        self.best = best
+        self.prefix = root.rstrip(os.sep) + os.sep
+        self.dirs, self.dirindex = [''], {root: 0}
+        self.parents, self.names = array('L'), []
+        self.query, self.pattern = '', None
+        self.heap = []
+        self.generation = 0
+        self.crawled, self.done, self.overflow = 0, False, False
+        self.stopped = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def path(self, n):
+        '''
+        Return the path, relative to root, of the nth path remembered.
+        '''
+        return self.dirs[self.parents[n]] + self.names[n]
+
+    def search(self, query):
+        with self.cond:
+            self.query = query
+            self.pattern = subsequence(query) if query else None
+            self.heap = []
+            self.generation += 1
+            self.cond.notify()
+
+    def results(self):
+        '''
+        Return the best (score, relative path) pairs so far, best first.
+        '''
+        with self.cond:
+            heap = list(self.heap)
+        return [(s, p) for s, _, p in sorted(heap, reverse=True)]
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify()
+
+    def rank(self, path, query, pattern, generation):
+        s = score(query, path, pattern)
+        if s is not None:
+            with self.cond:
+                if generation != self.generation:
+                    return
+                item = (s, -len(path), path)  # shorter paths win ties
+                if len(self.heap) < self.best:
+                    heapq.heappush(self.heap, item)
+                elif item > self.heap[0]:
+                    heapq.heapreplace(self.heap, item)
+
+    def work(self):
+        crawl = self.walker.walk(self.root, self.hidden)
+        count = scored = 0  # paths crawled, and remembered paths ranked
+        generation = None
+        while True:
+            with self.cond:
+                while (self.done and generation == self.generation and
+                       not self.stopped):
+                    self.cond.wait()
+                if self.stopped:
+                    return
+                if generation != self.generation:
+                    generation = self.generation
+                    query, pattern = self.query, self.pattern
+                    scored = 0
+                    if self.overflow:  # so crawl what we couldn't remember
+                        crawl = self.walker.walk(self.root, self.hidden)
+                        count, self.done = 0, False
+            if scored < len(self.names):
+                if pattern is not None:
+                    for n in range(scored, min(scored + 1000,
+                                               len(self.names))):
+                        self.rank(self.path(n), query, pattern, generation)
+                scored = min(scored + 1000, len(self.names))
+                continue
+            found = next(crawl, None)
+            if found is None:
+                with self.cond:
+                    self.done = True
+                continue
+            entry, depth = found
+            count += 1
+            if count <= len(self.names):
+                continue  # crawling again past what we remember
+            path = entry.path[len(self.prefix):]
+            if len(self.names) < self.limit:
+                parent = self.dirindex[os.path.dirname(entry.path)]
+                self.parents.append(parent)
+                self.names.append(entry.name)
+                scored += 1
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        self.dirindex[entry.path] = len(self.dirs)
+                        self.dirs.append(path + os.sep)
+                except OSError:
+                    pass
+            else:
+                self.overflow = True
+            self.crawled = max(self.crawled, count)
+            if pattern is not None:
+                self.rank(path, query, pattern, generation)
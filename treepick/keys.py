@@ -1,15 +1,21 @@
 # Copyright (c) 2018, Toby Slight. All rights reserved.
 # ISC License (ISCL) - see LICENSE file for details.
 
+import asyncio
 import curses
+import time
 from .actions import Actions
 from os import environ
 environ.setdefault('ESCDELAY', '12')  # otherwise it takes an age!
 
+FRAME = 1 / 60  # never draw more than sixty frames a second
+
 
 class Keys(Actions):
 
     def getpadkeys(self):
+        self.meter.pause()  # waiting on the page isn't work for the frame
+        self.screen.timeout(-1)
         self.screen.refresh()
         self.pad.refresh(self.pos, 0, 0, 0, self.y - 2, self.x - 1)
         while True:
@@ -35,80 +41,179 @@ class Keys(Actions):
             self.pad.refresh(self.pos, 0, 0, 0, self.y - 2, self.x - 1)
         self.screen.erase()
         self.screen.refresh()
+        self.damage()
+        self.meter.start()
 
-    def parse_curline(self, action):
-        line = 0
-        for child, depth in self.traverse():
-            if depth == 0:
-                continue
-            if line == self.curline:
-                {
-                    'expand': lambda: child.expand(self),
-                    'expand_all': lambda: child.expand_all(self),
-                    'toggle_expand': child.toggle_expand,
-                    'collapse': child.collapse,
-                    'collapse_all': lambda: child.collapse_all(self, depth),
-                    'toggle_pick': lambda: child.pick(self),
-                    'nextparent': lambda: child.nextparent(self, depth),
-                    'prevparent': lambda: child.prevparent(self, depth),
-                    'getsize': lambda: child.getsize(self),
-                }[action]()
-                break
-            line += 1
-
-    def getkeys(self):
+    def getfuzzykeys(self):
+        self.meter.pause()
+        self.mkfuzzy()
+        curses.curs_set(1)
+        self.screen.timeout(100)  # keep drawing results as they turn up
         while True:
-            self.drawtree()
+            self.drawfuzzy()
             key = self.screen.getch()
             keys = {
                 27: self.quit,
-                curses.KEY_F1: self.mkkeypad,
-                curses.KEY_F2: self.mkpickpad,
-                curses.KEY_F5: self.reset_all,
-                curses.KEY_F4: self.reset_picked,
-                curses.KEY_UP: self.up,
-                curses.KEY_DOWN: self.dn,
-                curses.KEY_PPAGE: self.pgup,
-                curses.KEY_NPAGE: self.pgdn,
-                curses.KEY_LEFT: lambda: self.parse_curline('collapse'),
-                curses.KEY_RIGHT: lambda: self.parse_curline('expand'),
-                curses.KEY_SRIGHT: lambda: self.parse_curline('expand_all'),
-                curses.KEY_SLEFT: lambda: self.parse_curline('collapse_all'),
-                curses.KEY_HOME: self.top,
-                curses.KEY_END: self.bottom,
+                curses.KEY_ENTER: self.fuzzy_pick,
+                curses.KEY_DOWN: self.fuzzy_dn,
+                curses.KEY_UP: self.fuzzy_up,
+                curses.KEY_BACKSPACE: self.fuzzy_del,
                 curses.KEY_RESIZE: self.resize,
-                ord('q'): self.quit,
-                ord('?'): self.mkkeypad,
-                ord('p'): self.mkpickpad,
-                ord('R'): self.reset_all,
-                ord('r'): self.reset_picked,
-                ord('j'): self.dn,
-                ord('k'): self.up,
-                ord('b'): self.pgup,
-                ord('f'): self.pgdn,
-                ord('l'): lambda: self.parse_curline('expand'),
-                ord('h'): lambda: self.parse_curline('collapse'),
-                ord('L'): lambda: self.parse_curline('expand_all'),
-                ord('H'): lambda: self.parse_curline('collapse_all'),
-                ord('g'): self.top,
-                ord('G'): self.bottom,
-                ord('\t'): lambda: self.parse_curline('toggle_expand'),
-                ord('\n'): lambda: self.parse_curline('toggle_expand'),
-                ord(' '): lambda: self.parse_curline('toggle_pick'),
-                ord('J'): lambda: self.parse_curline('nextparent'),
-                ord('K'): lambda: self.parse_curline('prevparent'),
-                ord('s'): lambda: self.parse_curline('getsize'),
-                ord('S'): self.getsizeall,
-                ord('.'): self.toggle_hidden,
-                ord('/'): self.find,
-                ord('n'): self.findnext,
-                ord('N'): self.findprev,
-                ord('v'): self.pickall,
-                ord(':'): self.pickglobs,
+                ord('\n'): self.fuzzy_pick,
+                14: self.fuzzy_dn,  # ^N
+                16: self.fuzzy_up,  # ^P
+                127: self.fuzzy_del,
             }
             try:
                 if keys[key]():
-                    return self.picked
+                    break
             except KeyError:
-                pass
-            self.curline %= self.line
+                if 32 <= key < 127:
+                    self.fuzzy_add(chr(key))
+        curses.curs_set(0)
+        self.meter.start()
+
+    def parse_curline(self, action):
+        if not self.rows:
+            return
+        child, depth = self.rows[self.curline]
+        {
+            'expand': lambda: self.expand(child),
+            'expand_all': lambda: self.expand_all(child),
+            'toggle_expand': lambda: self.toggle_expand(child),
+            'collapse': lambda: self.collapse(child),
+            'collapse_all': lambda: self.collapse_all(child, depth),
+            'toggle_pick': lambda: self.pick(child),
+            'nextparent': lambda: self.nextparent(child, depth),
+            'prevparent': lambda: self.prevparent(child, depth),
+            'getsize': lambda: self.getsize(child),
+        }[action]()
+
+    async def getch(self, timeout=None):
+        '''
+        Return the next key, or -1 if none turns up within timeout seconds or
+        a task finishes first, letting tasks run while waiting, and giving
+        them a turn even when keys are already waiting.
+        '''
+        await asyncio.sleep(0)
+        self.screen.timeout(0)
+        key = self.screen.getch()
+        if key != -1 or timeout == 0:
+            return key
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(self.input, lambda: ready.done() or
+                        ready.set_result(None))
+        try:
+            await asyncio.wait([ready] + self.tasks, timeout=timeout,
+                               return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            loop.remove_reader(self.input)
+            ready.cancel()
+        return self.screen.getch()
+
+    async def getkey(self):
+        '''
+        Wait for a key, returning early with -1 whenever the tree needs to be
+        redrawn because something has changed on disk or more of a directory
+        has been listed, to poll for sizes on screen that are still being
+        worked out, or to show how a task is getting on. Never waits for
+        longer than half a second, as curses only notices the terminal has
+        been resized when asked for a key, and waiting on stdin doesn't.
+        '''
+        while True:
+            busy = bool(self.tasks)
+            if busy or self.waiting or self.state.loading:
+                timeout = 0.1
+            else:
+                timeout = 0.5  # for changes on disk too, if watching
+            key = await self.getch(timeout)
+            if (self.rescan() or self.stream() or key != -1 or self.waiting or
+                    busy):
+                return key
+
+    def getkeys(self):
+        '''
+        Run the keys and any tasks they start on an event loop, returning
+        the picked paths when done.
+        '''
+        return asyncio.run(self.loop())
+
+    async def loop(self):
+        keys = {
+            27: self.escape,
+            curses.KEY_F1: self.mkkeypad,
+            curses.KEY_F2: self.mkpickpad,
+            curses.KEY_F5: self.reset_all,
+            curses.KEY_F4: self.reset_picked,
+            curses.KEY_UP: self.up,
+            curses.KEY_DOWN: self.dn,
+            curses.KEY_PPAGE: self.pgup,
+            curses.KEY_NPAGE: self.pgdn,
+            curses.KEY_LEFT: lambda: self.parse_curline('collapse'),
+            curses.KEY_RIGHT: lambda: self.parse_curline('expand'),
+            curses.KEY_SRIGHT: lambda: self.parse_curline('expand_all'),
+            curses.KEY_SLEFT: lambda: self.parse_curline('collapse_all'),
+            curses.KEY_HOME: self.top,
+            curses.KEY_END: self.bottom,
+            curses.KEY_RESIZE: self.resize,
+            ord('q'): self.quit,
+            ord('?'): self.mkkeypad,
+            ord('p'): self.mkpickpad,
+            ord('R'): self.reset_all,
+            ord('r'): self.reset_picked,
+            ord('j'): self.dn,
+            ord('k'): self.up,
+            ord('b'): self.pgup,
+            ord('f'): self.pgdn,
+            ord('l'): lambda: self.parse_curline('expand'),
+            ord('h'): lambda: self.parse_curline('collapse'),
+            ord('L'): lambda: self.parse_curline('expand_all'),
+            ord('H'): lambda: self.parse_curline('collapse_all'),
+            ord('g'): self.top,
+            ord('G'): self.bottom,
+            ord('\t'): lambda: self.parse_curline('toggle_expand'),
+            ord('\n'): lambda: self.parse_curline('toggle_expand'),
+            ord(' '): lambda: self.parse_curline('toggle_pick'),
+            ord('J'): lambda: self.parse_curline('nextparent'),
+            ord('K'): lambda: self.parse_curline('prevparent'),
+            ord('s'): lambda: self.parse_curline('getsize'),
+            ord('S'): self.getsizeall,
+            ord('.'): self.toggle_hidden,
+            ord('/'): self.find,
+            ord('F'): self.getfuzzykeys,
+            ord('n'): self.findnext,
+            ord('N'): self.findprev,
+            ord('v'): self.pickall,
+            ord(':'): self.pickglobs,
+            ord(';'): self.pickdeep,
+            ord('T'): self.toggle_meter,
+        }
+        # these prompt over the tree, so it should be up to date underneath
+        prompts = set([ord('/'), ord(':'), ord(';')])
+        while True:
+            if self.failed is not None:
+                raise self.failed
+            self.drawtree()
+            self.meter.stop()
+            frame = time.monotonic() + FRAME
+            key = await self.getkey()
+            self.meter.start()
+            # apply every key that is already waiting, or that turns up before
+            # the next frame is due, so a held key is drawn once per frame
+            # rather than once per keystroke
+            while key != -1:
+                if key in prompts:
+                    self.drawtree()
+                try:
+                    if keys[key]():
+                        return self.state.picked
+                except KeyError:
+                    pass
+                if self.line:
+                    self.curline %= self.line
+                else:
+                    self.curline = 0
+                self.meter.pause()
+                key = await self.getch(max(0, frame - time.monotonic()))
+                self.meter.start()
@@ -0,0 +1,82 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import os
+import threading
+import time
+
+from .paths import Paths
+
+
+class Meter:
+    '''
+    Times each frame and counts the nodes made and the directories listed and
+    statted to draw it. Counting works by wrapping the functions that do the
+    work, and only while the meter is on, so it costs nothing at all while it
+    is off. Only calls made by the thread that turned it on are counted, not
+    those of sizing or reading in the background.
+    '''
+    def __init__(self):
+        self.on = False
+        self.counts = {'nodes': 0, 'listdir': 0, 'stat': 0}
+        self.last = dict(self.counts)
+        self.frame = 0.0  # seconds of work the last frame took
+        self.busy, self.began = 0.0, None
+        self.originals = {}
+
+    def count(self, name, func):
+        counts, ours = self.counts, threading.get_ident()
+
+        def counted(*args, **kwargs):
+            if threading.get_ident() == ours:
+                counts[name] += 1
+            return func(*args, **kwargs)
+        return counted
+
+    def toggle(self):
+        if self.on:
+            for (owner, attr), func in self.originals.items():
+                setattr(owner, attr, func)
+            self.originals = {}
+        else:
+            # os.path.isdir and friends call os.stat, so are counted too
+            for owner, attr, name in ((Paths, '__init__', 'nodes'),
+                                      (os, 'scandir', 'listdir'),
+                                      (os, 'stat', 'stat'),
+                                      (os, 'lstat', 'stat')):
+                func = getattr(owner, attr)
+                self.originals[(owner, attr)] = func
+                setattr(owner, attr, self.count(name, func))
+            self.busy, self.began = 0.0, None
+        self.on = not self.on
+
+    def start(self):
+        '''
+        Start timing some of the work for this frame.
+        '''
+        if self.on:
+            self.began = time.perf_counter()
+
+    def pause(self):
+        '''
+        Stop timing while waiting for keys, or anything else that isn't work.
+        '''
+        if self.on and self.began is not None:
+            self.busy += time.perf_counter() - self.began
+            self.began = None
+
+    def stop(self):
+        '''
+        End the frame, keeping its figures to show in the next one.
+        '''
+        if self.on:
+            self.pause()
+            self.frame, self.busy = self.busy, 0.0
+            self.last = dict(self.counts)
+            for name in self.counts:
+                self.counts[name] = 0
+
+    def summary(self):
+        return "{:.1f}ms {} nodes {} listdir {} stat".format(
+            self.frame * 1000, self.last['nodes'], self.last['listdir'],
+            self.last['stat'])
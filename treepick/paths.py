@@ -2,75 +2,378 @@
 # ISC License (ISCL) - see LICENSE file for details.
 
 import os
+import threading
 
-from .keys import Keys
+from bisect import bisect_left, bisect_right
 
+from .expanded import Expanded
+from .picked import Picked
+from .search import Index
+from .walk import DIR, FILE, LINK, Entries, Listing, compact
 
-class Paths(Keys):
-    def __init__(self,
-                 screen,
-                 name,
-                 hidden,
-                 picked=[],
-                 expanded=set(),
-                 sized=dict()):
-        Keys.__init__(self,
-                      screen,
-                      name,
-                      hidden,
-                      picked,
-                      expanded,
-                      sized)
-        self.paths = None
-        self.children = self.getchildren()
+PAGE = 256  # slots for the nodes of children allocated at once
 
-    def listdir(self, path):
+
+class State:
+    '''
+    Attributes shared by every node in a tree. Nodes only hold a reference to
+    this, so resetting an attribute is seen by the whole tree at once.
+    '''
+    def __init__(self, hidden, picked=[], expanded=set(), sized=dict()):
+        self.hidden = hidden
+        self.picked = Picked(picked)
+        self.expanded = Expanded(expanded)
+        self.sized = sized
+        self.listings = {}
+        self.loading = {}  # listings still being read in the background
+        self.totals = {}  # (files, bytes) beneath each directory sized
+        # held to add to sized, totals or listings from another thread, and
+        # to go through them while they might be
+        self.lock = threading.Lock()
+        self.index = Index()  # of every directory loaded, for searching
+
+
+class Paths:
+    '''
+    A node in the directory tree. Holds nothing but its basename, its parent,
+    its children and a reference to the shared state, and builds its full
+    path from its parent's when asked - all drawing is done by the controller.
+    '''
+    __slots__ = ('basename', 'state', 'kind', 'parent', 'index', 'path',
+                 'prefix', 'paths', 'probed', 'probe')
+
+    def __init__(self, name, state, kind=None, parent=None, index=0):
+        self.basename = name  # the whole path for the root
+        self.state = state
+        self.kind = kind  # FILE, DIR or LINK from our parent's listing
+        self.parent = parent
+        self.index = index  # of ourself in our parent's paths
+        self.path = name if parent is None else None  # kept for directories
+        self.prefix = None  # our path ending in a separator, once listed
+        self.paths = None  # Children, once we've been listed
+        self.probed, self.probe = False, None
+
+    @property
+    def name(self):
+        '''
+        Our whole path. Directories keep theirs once it's made, so the very
+        same string is looked up in the expanded set each time.
+        '''
+        if self.path is not None:
+            return self.path
+        name = self.parent.prefix + self.basename
+        if self.kind == DIR:
+            self.path = name
+        return name
+
+    def isdir(self):
         '''
-        Return a list of all non dotfiles in a given directory.
+        Use the type from our parent's listing rather than asking the
+        filesystem again, only following a symlink the first time we're asked.
         '''
-        for f in os.listdir(path):
-            if not f.startswith('.'):
-                yield f
+        if self.kind is None or self.kind == LINK:
+            self.kind = DIR if os.path.isdir(self.name) else FILE
+        return self.kind == DIR
 
-    def getchildren(self):
+    def stat(self):
         '''
-        Create list of absolute paths to be used to instantiate path objects
-        for traversal, based on whether or not hidden attribute is set.
+        Return our stat result, falling back to the link itself for dangling
+        symlinks.
         '''
+        name = self.name
         try:
-            if self.hidden:
-                return [os.path.join(self.name, child)
-                        for child in sorted(self.listdir(self.name))]
+            return os.stat(name)
+        except OSError:
+            return os.lstat(name)
+
+    def scandir(self, stream=False):
+        '''
+        Return the sorted Entries of this node, listing it with
+        scandir only the first time it is asked for across the whole tree.
+        If streaming, a big directory is listed in the background instead,
+        and what has been read of it so far is returned.
+        '''
+        listings, loading = self.state.listings, self.state.loading
+        if self.name in listings:
+            return listings[self.name]
+        if stream and self.name in loading:
+            return loading[self.name].entries
+        try:
+            if stream:
+                listing = Listing(self.name)
+                if not listing.done:
+                    loading[self.name] = listing
+                    return listing.entries
+                entries = listing.entries
             else:
-                return [os.path.join(self.name, child)
-                        for child in sorted(os.listdir(self.name))]
+                with os.scandir(self.name) as it:
+                    entries = compact(it)
         except OSError:
-            return None  # probably permission denied
+            entries = None  # probably permission denied
+        with self.state.lock:  # we may be listed ahead in another thread
+            listings[self.name] = entries
+        return entries
+
+    def listdir(self, stream=False):
+        '''
+        Return our Entries, without dotfiles if the hidden attribute is set.
+        '''
+        if not self.isdir():
+            return None
+        return self.shown(self.scandir(stream))
+
+    def shown(self, entries):
+        '''
+        Return the entries from a listing of ours that are to be shown.
+        '''
+        if entries is not None and self.state.hidden:
+            return Entries([n for n in entries.names if not n.startswith('.')],
+                           entries.dirs, entries.links)
+        return entries
+
+    def haschildren(self):
+        '''
+        Find out whether we have any children to show, stopping at the first
+        one instead of listing the whole directory. None if we can't tell.
+        '''
+        if not self.probed:
+            if not self.isdir():
+                self.probe = None
+            elif self.name in self.state.listings:
+                entries = self.listdir()
+                self.probe = None if entries is None else bool(entries)
+            else:
+                self.probe = False
+                try:
+                    with os.scandir(self.name) as it:
+                        for entry in it:
+                            if not (self.state.hidden and
+                                    entry.name.startswith('.')):
+                                self.probe = True
+                                break
+                except OSError:
+                    self.probe = None  # probably permission denied
+            self.probed = True
+        return self.probe
 
     def getpaths(self):
         '''
-        If we have children, use a list comprehension to instantiate new paths
-        objects to traverse.
+        If we have children, return them as a sequence of paths objects that
+        are only made as they're looked at.
         '''
-        self.children = self.getchildren()
-        if self.children is None:
-            return
         if self.paths is None:
-            self.paths = [Paths(self.screen,
-                                os.path.join(self.name, child),
-                                self.hidden,
-                                self.picked,
-                                self.expanded,
-                                self.sized)
-                          for child in self.children]
+            entries = self.listdir(stream=True)
+            if entries is None:
+                return
+            self.path = self.name
+            self.prefix = os.path.join(self.path, '')
+            self.paths = Children(self, entries)
+            self.state.index.add(self.paths)
         return self.paths
 
-    def traverse(self):
+    def reload(self):
+        '''
+        List ourselves again after a change on disk, keeping the nodes of the
+        children that are still there, and return the paths of those that
+        have gone. A big directory that had been listed in full is listed
+        again in the background, and keeps its old children until it has all
+        been read.
+        '''
+        state = self.state
+        state.listings.pop(self.name, None)
+        listing = state.loading.pop(self.name, None)
+        if listing is not None:
+            listing.stop()  # it may have read past the change already
+        self.probed = False
+        if self.paths is None:
+            return []
+        entries = self.listdir(stream=True)
+        if self.name in state.loading:
+            state.loading[self.name].whole = listing is None
+            if listing is None:
+                return []
+        return self.update(entries)
+
+    def update(self, entries):
+        '''
+        Take our children from a new listing, keeping the nodes already made
+        for those still in it, and return the paths of those that aren't.
+        '''
+        old = self.paths
+        if entries is None:
+            self.paths = None
+            return [node.name for node in old.made()]
+        self.paths, gone = Children(self, entries), []
+        for node in old.made():
+            i = self.paths.find(node.basename)
+            if i is None:
+                gone.append(node.name)
+            else:
+                node.kind, node.index = entries.kind(node.basename), i
+                self.paths.adopt(i, node)
+        self.state.index.add(self.paths)
+        return gone
+
+    def child(self, name):
+        '''
+        Return our child with the given basename, or None.
+        '''
+        paths = self.getpaths()
+        if paths:
+            i = paths.find(name)
+            if i is not None:
+                return paths[i]
+
+    def key(self):
+        '''
+        Our position in the tree as the index of each ancestor in its parent,
+        so that sorting nodes by key puts them in the order they're drawn.
+        '''
+        key = []
+        node = self
+        while node.parent is not None:
+            key.append(node.index)
+            node = node.parent
+        return key[::-1]
+
+    def isvisible(self):
+        expanded = self.state.expanded
+        node = self.parent
+        while node is not None:
+            if node.path not in expanded:  # every ancestor has been listed
+                return False
+            node = node.parent
+        return True
+
+    def runs(self, depth=1):
+        '''
+        Generator of the rows beneath us that are showing, in the order
+        they're drawn, as runs of siblings (children, start, stop, depth), so
+        only the nodes of expanded directories need to be made.
+        '''
+        expanded = self.state.expanded
+        stack, node = [], self
+        while True:
+            if node is not None and node.name in expanded:
+                paths = node.getpaths()
+                if paths:
+                    stack.append([paths, iter(paths.expanded()), 0, depth])
+            if not stack:
+                return
+            frame = stack[-1]
+            paths, opened, start, d = frame
+            i = next(opened, None)
+            if i is None:
+                if start < len(paths):
+                    yield paths, start, len(paths), d
+                stack.pop()
+                node = None
+            else:
+                yield paths, start, i + 1, d
+                frame[2] = i + 1
+                node, depth = paths[i], d + 1
+
+
+class Children:
+    '''
+    The children of a directory as a sequence of paths objects, only made
+    as they're looked at, so a directory with millions of entries doesn't
+    need millions of nodes to be shown. Their slots are allocated a page at
+    a time, so a huge directory only pays for the parts that have been seen.
+    '''
+    def __init__(self, parent, entries):
+        self.parent = parent
+        self.entries = entries  # sorted, without dotfiles if hidden
+        self.pages = {}  # page number to its nodes, or None for those unmade
+        self.dirs = None  # indices of those that are or may be directories
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self.entries)
+        page = self.pages.get(i // PAGE)
+        if page is None:
+            page = self.page(i // PAGE)
+        node = page[i % PAGE]
+        if node is None:
+            name = self.entries.names[i]
+            node = page[i % PAGE] = Paths(name, self.parent.state,
+                                          self.entries.kind(name),
+                                          self.parent, i)
+        return node
+
+    def __iter__(self):
+        for i in range(len(self.entries)):
+            yield self[i]
+
+    def page(self, number):
+        page = self.pages.get(number)
+        if page is None:
+            size = min(PAGE, len(self.entries) - number * PAGE)
+            page = self.pages[number] = [None] * size
+        return page
+
+    def adopt(self, i, node):
+        '''
+        Use a node made for a previous listing as the one for entry i.
+        '''
+        self.page(i // PAGE)[i % PAGE] = node
+
+    def made(self):
+        '''
+        Generator of the nodes that have been made so far.
+        '''
+        for page in self.pages.values():
+            for node in page:
+                if node is not None:
+                    yield node
+
+    def path(self, i):
+        return self.parent.prefix + self.entries.names[i]
+
+    def find(self, name):
+        '''
+        Binary search our entries for the index of a basename, or None.
+        '''
+        names = self.entries.names
+        i = bisect_left(names, name)
+        if i < len(names) and names[i] == name:
+            return i
+
+    def nextdir(self, i, step):
+        '''
+        Return the index of the nearest directory after i, or before it if
+        step is negative, or None. Which entries are directories, or symlinks
+        that might be, is worked out once from the listing, so only symlinks
+        need their node made to find out.
+        '''
+        if self.dirs is None:
+            entries = self.entries
+            dirs, links = entries.dirs, entries.links
+            if (len(dirs) + len(links)) * 16 < len(entries):
+                # few enough to look up, rather than go through every name
+                found = [self.find(name) for name in dirs | links]
+                self.dirs = sorted(j for j in found if j is not None)
+            else:
+                self.dirs = [j for j, name in enumerate(entries.names)
+                             if name in dirs or name in links]
+        if step > 0:
+            k = bisect_right(self.dirs, i)
+        else:
+            k = bisect_left(self.dirs, i) - 1
+        while 0 <= k < len(self.dirs):
+            if self[self.dirs[k]].isdir():
+                return self.dirs[k]
+            k += step
+
+    def expanded(self):
         '''
-        Recursive generator that lazily unfolds the filesystem.
+        Return the indices of those of us that are expanded, in order, going
+        through just the directories expanded in our parent.
         '''
-        yield self, 0
-        if self.name in self.expanded:
-            for path in self.getpaths():
-                for child, depth in path.traverse():
-                    yield child, depth + 1
+        parent = self.parent
+        found = [self.find(name)
+                 for name in parent.state.expanded.names(parent.name)]
+        return sorted(i for i in found if i is not None)
@@ -0,0 +1,107 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import fnmatch
+import os
+import re
+
+
+class Globs:
+    '''
+    Globs compiled into a single pattern, matching a path if fnmatch would
+    match it, or its basename, against any one of them.
+    '''
+    def __init__(self, globs):
+        self.globs = list(globs)
+        self.pattern = re.compile(
+            '|'.join(fnmatch.translate(g) for g in self.globs) or '(?!)')
+        # only globs containing a separator can't match a basename, and so
+        # are the only ones that rule out whole directories
+        if all(os.sep in g for g in self.globs):
+            self.prefixes = [re.split(r'[*?[]', g)[0] for g in self.globs]
+        else:
+            self.prefixes = None
+
+    def match(self, path):
+        return bool(self.pattern.match(path) or
+                    self.pattern.match(os.path.basename(path)))
+
+    def viable(self, path):
+        '''
+        Could anything beneath this directory match? Compares the directory
+        with the literal part of each glob up to its first wildcard.
+        '''
+        if self.prefixes is None:
+            return True
+        path = path.rstrip(os.sep) + os.sep
+        return any(p.startswith(path) or path.startswith(p)
+                   for p in self.prefixes)
+
+
+class Picked:
+    '''
+    The picked paths, in the order they were picked. Literal paths are kept as
+    the keys of a dict, so picking, unpicking and membership tests don't have
+    to scan a list, while anything that looks like a glob is also compiled
+    into a single pattern. Whether a path or any of its ancestors has been
+    picked then costs a lookup per path component plus one regex match.
+    '''
+    def __init__(self, paths=[]):
+        self.paths = {}
+        self.globs = []
+        self.matcher = None
+        for path in paths:
+            self.append(path)
+
+    def __contains__(self, path):
+        return path in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def append(self, path):
+        if path not in self.paths:
+            self.paths[path] = None
+            if re.search(r'[*?[]', path):
+                self.globs.append(path)
+                self.matcher = None
+
+    def remove(self, path):
+        del self.paths[path]
+        if path in self.globs:
+            self.globs.remove(path)
+            self.matcher = None
+
+    def toggle(self, path):
+        if path in self.paths:
+            self.remove(path)
+        else:
+            self.append(path)
+
+    def matches(self, path):
+        '''
+        Match a path against any picked globs.
+        '''
+        if not self.globs:
+            return False
+        if self.matcher is None:
+            self.matcher = Globs(self.globs)
+        return self.matcher.match(path)
+
+    def covers(self, path):
+        '''
+        Has this path, or any of its ancestors, been picked?
+        '''
+        if self.paths:
+            ancestor = path
+            while True:
+                if ancestor in self.paths:
+                    return True
+                parent = os.path.dirname(ancestor)
+                if parent == ancestor:
+                    break
+                ancestor = parent
+        return self.matches(path)
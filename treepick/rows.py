@@ -0,0 +1,137 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+from bisect import bisect_right
+
+
+class Rows:
+    '''
+    The visible rows of the tree as (node, depth), in the order they're
+    drawn. They're held as runs of siblings (children, start, stop, depth),
+    so a directory's children take up one run however many of them there
+    are, and the node for a row is only made when the row is looked at.
+    '''
+    def __init__(self, runs=()):
+        self.runs = self.merged(runs)
+        self.starts = []  # row number of the first row of each run
+        self.length = 0
+        self.restart(0)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.length
+        if not 0 <= row < self.length:
+            raise IndexError(row)
+        run = bisect_right(self.starts, row) - 1
+        children, start, stop, depth = self.runs[run]
+        return children[start + row - self.starts[run]], depth
+
+    def __iter__(self):
+        return self.since(0)
+
+    def __reversed__(self):
+        # from a copy of the runs, so rows can be spliced while going through
+        for children, start, stop, depth in reversed(list(self.runs)):
+            for i in range(stop - 1, start - 1, -1):
+                yield children[i], depth
+
+    def since(self, row):
+        '''
+        Generator of the rows from the given one on, looking for where to
+        start just the once.
+        '''
+        if not 0 <= row < self.length:
+            return
+        first = bisect_right(self.starts, row) - 1
+        skip = row - self.starts[first]
+        for run in range(first, len(self.runs)):
+            children, start, stop, depth = self.runs[run]
+            for i in range(start + skip, stop):
+                yield children[i], depth
+            skip = 0
+
+    def row(self, key):
+        '''
+        Return the row of the node with the given key, or the row it would be
+        on if it isn't showing. Binary searches the runs rather than the rows,
+        by the key of the first node of each, which is worked out from its
+        parent without making the node, and then counts along the run.
+        '''
+        lo, hi = 0, len(self.runs)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            children, start, stop, depth = self.runs[mid]
+            if children.parent.key() + [start] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if not lo:
+            return 0
+        children, start, stop, depth = self.runs[lo - 1]
+        first, base = self.starts[lo - 1], children.parent.key()
+        n = len(base)
+        if len(key) > n and key[:n] == base and key[n] < stop:
+            # on this run, or hidden beneath one of it that isn't expanded
+            return first + key[n] - start + (len(key) > n + 1)
+        return first + stop - start
+
+    def paths(self):
+        '''
+        Generator of the path of every row, without making any nodes, as they
+        were when it started.
+        '''
+        for children, start, stop, depth in list(self.runs):
+            for i in range(start, stop):
+                yield children.path(i)
+
+    def merged(self, runs):
+        '''
+        Return a list of runs, with those that carry straight on from the one
+        before joined to it.
+        '''
+        joined = []
+        for run in runs:
+            if joined:
+                children, start, stop, depth = joined[-1]
+                if children is run[0] and stop == run[1]:
+                    joined[-1] = (children, start, run[2], depth)
+                    continue
+            joined.append(run)
+        return joined
+
+    def restart(self, first):
+        '''
+        Work out the start of every run from the given one on.
+        '''
+        del self.starts[first:]
+        row = 0
+        if first:
+            children, start, stop, depth = self.runs[first - 1]
+            row = self.starts[first - 1] + stop - start
+        for children, start, stop, depth in self.runs[first:]:
+            self.starts.append(row)
+            row += stop - start
+        self.length = row
+
+    def splice(self, row, runs):
+        '''
+        Replace the rows beneath the node on the given row with new runs.
+        '''
+        run = bisect_right(self.starts, row) - 1
+        children, start, stop, depth = self.runs[run]
+        i = start + row - self.starts[run]
+        end = run + 1
+        if i + 1 == stop:  # only the last of a run can have rows beneath it
+            while end < len(self.runs) and self.runs[end][3] > depth:
+                end += 1
+        new = [(children, start, i + 1, depth)]
+        new.extend(runs)
+        if i + 1 < stop:
+            new.append((children, i + 1, stop, depth))
+        first = max(run - 1, 0)
+        self.runs[first:end + 1] = self.merged(
+            self.runs[first:run] + new + self.runs[end:end + 1])
+        self.restart(first)
@@ -7,12 +7,37 @@ import grp
 import os
 import pwd
 import socket
+import sys
+
+from datetime import datetime
+from functools import lru_cache
 
 from .color import Color
+from .meter import Meter
+
+
+@lru_cache(maxsize=256)
+def username(uid):
+    '''
+    Return the name of a user id, asking the user database only the first
+    time, as that can mean a trip to a directory server.
+    '''
+    try:
+        return pwd.getpwuid(uid)[0]
+    except KeyError:
+        return str(uid)
+
+
+@lru_cache(maxsize=256)
+def groupname(gid):
+    try:
+        return grp.getgrgid(gid)[0]
+    except KeyError:
+        return str(gid)
 
 
 class Screen:
-    def __init__(self, screen, picked):
+    def __init__(self, screen, state):
         curses.curs_set(0)  # get rid of cursor
         self.screen = screen
         self.y, self.x = self.screen.getmaxyx()
@@ -24,9 +49,22 @@ class Screen:
         self.pad = curses.newpad(self.y, self.x)
         self.footer.refresh()
         self.header.refresh()
-        self.picked = picked
+        self.state = state
         self.color = Color(self.win)
         self.lc, self.pos = (0,)*2
+        self.painted, self.offset = None, 0  # what each line of win shows
+        self.headed, self.footed = None, None  # nodes header and footer show
+        self.userhost = getpass.getuser() + "@" + socket.gethostname()
+        self.meter = Meter()
+        self.input = sys.stdin.fileno()  # where curses reads keys from
+        self.progress = None  # of the task that is running, if any
+
+    def damage(self):
+        '''
+        Forget what the windows show, after something else has drawn over
+        them, so they are all painted afresh next time.
+        '''
+        self.painted, self.headed, self.footed = None, None, None
 
     def resize(self):
         self.screen.erase()
@@ -37,15 +75,14 @@ class Screen:
             self.pad.resize(self.lc + 2, self.x)
         self.footer.mvwin(self.y - 1, 0)
         self.footer.resize(1, self.x)
+        self.damage()
         self.screen.refresh()
         self.header.refresh()
         self.win.refresh()
         self.footer.refresh()
 
     def mkheader(self, path):
-        user = getpass.getuser()
-        host = socket.gethostname()
-        userhost = user + "@" + host
+        userhost = self.userhost
         msg = userhost + " " + path
         msg = (msg[:self.x - 3] + '..') if len(msg) > self.x - 3 else msg
         try:
@@ -57,25 +94,21 @@ class Screen:
                               curses.A_BOLD | curses.color_pair(3))
         except curses.error:
             pass
-        self.header.refresh()
+        self.header.noutrefresh()
 
-    def mkfooter(self, path, children=None):
-        from datetime import datetime
-        user = pwd.getpwuid(os.stat(path).st_uid)[0]
-        group = grp.getgrgid(os.stat(path).st_gid)[0]
-        usergroup = user + " " + group
+    def mkfooter(self, path, children=None, stat=None):
+        if stat is None:
+            stat = os.stat(path)
+        usergroup = username(stat.st_uid) + " " + groupname(stat.st_gid)
 
-        mtime = os.path.getmtime(path)
+        mtime = stat.st_mtime
         mdate = datetime.fromtimestamp(mtime).strftime('%Y-%m-%d %H:%M:%S')
 
-        mode = oct(os.stat(path).st_mode)[-3:]
+        mode = oct(stat.st_mode)[-3:]
 
-        if children:
-            children = len(children)
-        else:
-            children = 0
-
-        msg = usergroup + " " + mdate + " " + mode + " " + str(children)
+        msg = usergroup + " " + mdate + " " + mode
+        if children is not None:  # or we don't know how many there are
+            msg += " " + str(len(children))
         msg = (msg[:self.x - 3] + '..') if len(msg) > self.x - 3 else msg
         try:
             self.footer.addstr(0, 0, msg)
@@ -88,11 +121,44 @@ class Screen:
                               curses.A_BOLD | curses.color_pair(6))
             self.footer.chgat(0, len(usergroup) + len(mdate) + len(mode) + 2,
                               curses.A_BOLD | curses.color_pair(5))
+            stats = ""
+            if self.progress is not None:
+                stats += " " + self.progress + " (ESC to stop)"
+            if self.meter.on:
+                stats += " " + self.meter.summary()
+            if stats:
+                x = max(len(msg), self.x - len(stats) - 1)
+                self.footer.addstr(0, x, stats[:self.x - x - 1],
+                                   curses.A_BOLD | curses.color_pair(1))
         except curses.error:
             pass
-        self.footer.refresh()
+        self.footer.noutrefresh()
 
-    def mktb(self, prompt):
+    def mkprompt(self, prompt, text, status=''):
+        '''
+        Draw a prompt and the text typed so far in the footer, with a status
+        message on the right and the cursor after the text.
+        '''
+        length = len(prompt)
+        text = text[-(self.x - length - len(status) - 2):]
+        try:
+            self.footer.erase()
+            self.footer.addstr(0, 0, prompt + text)
+            self.footer.addstr(0, self.x - len(status) - 1, status)
+            self.footer.chgat(0, 0, length,
+                              curses.A_BOLD | curses.color_pair(3))
+            self.footer.chgat(0, self.x - len(status) - 1, len(status),
+                              curses.A_BOLD | curses.color_pair(5))
+            self.footer.move(0, length + len(text))
+        except curses.error:
+            pass
+        self.footer.noutrefresh()
+
+    def mktb(self, prompt, callback=None):
+        '''
+        Prompt for a line of text in the footer, passing what has been typed
+        so far to callback after every keystroke.
+        '''
         from curses.textpad import Textbox
         length = len(prompt)
         self.footer.erase()
@@ -102,10 +168,22 @@ class Screen:
         self.footer.refresh()
         tb = self.footer.subwin(self.y - 1, length)
         box = Textbox(tb)
-        box.edit()
+
+        def validate(ch):
+            if callback is None or ch in (7, 10):  # ^G and RET finish
+                return ch
+            box.do_command(ch)
+            callback(box.gather().strip())
+            tb.refresh()  # put the cursor back in the box
+            return 0
+
+        self.meter.pause()  # waiting on the prompt isn't work for the frame
+        box.edit(validate)
+        self.meter.start()
         curses.curs_set(0)
         result = box.gather()
         self.footer.erase()
+        self.footed = None
         return result
 
     def mkpadfooter(self):
@@ -139,8 +217,10 @@ class Screen:
             SPC               : Toggle picking of paths.
             v                 : Toggle picking of all currently expanded paths.
             :                 : Toggle picking of paths based on entered globs.
+            ;                 : Pick paths beneath directory matching globs.
             p                 : View a list of all picked paths.
             /                 : Search for an entered string.
+            F                 : Fuzzy find anything beneath the root.
             n                 : Jump to next occurrence of last search string.
             N                 : Jump to prev occurrence of last search string.
             .                 : Toggle display of dotfiles.
@@ -148,8 +228,10 @@ class Screen:
             S                 : Display totol size of all expanded paths.
             F4, r             : Reset picked paths.
             F5, R             : Reset picked paths, expansion and size display.
+            T                 : Toggle frame timings in the footer.
             F1, ?             : View this help page.
-            q, ESC            : Quit and display all marked paths.
+            ESC               : Stop what L, S, v, : or ; is doing, or quit.
+            q                 : Quit and display all marked paths.
             '''
         msg = dedent(msg).strip()
         self.lc = len(msg.splitlines())
@@ -168,15 +250,15 @@ class Screen:
     def mkpickpad(self):
         self.screen.erase()
         self.pad.erase()
-        self.pad.resize(len(self.picked) + 2, self.x)
+        self.pad.resize(len(self.state.picked) + 2, self.x)
         try:
-            if self.picked:
-                self.pad.addstr(0, 0, "\n".join(self.picked))
+            if self.state.picked:
+                self.pad.addstr(0, 0, "\n".join(self.state.picked))
             else:
                 self.pad.addstr(0, 0, "You haven't picked anything yet!")
                 self.pad.chgat(0, 0, curses.color_pair(1) | curses.A_BOLD)
             self.mkpadfooter()
         except curses.error:
             pass
-        self.lc = len(self.picked)
+        self.lc = len(self.state.picked)
         self.getpadkeys()
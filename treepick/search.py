@@ -0,0 +1,66 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import os
+
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class Index:
+    '''
+    The basenames of the children of every directory loaded so far, joined
+    into one string so a substring search over all of them is a handful of
+    str.find calls. Matches are found without making a node for any of them.
+    '''
+    def __init__(self):
+        self.groups = {}  # directory path to the Children loaded for it
+        self.order, self.blob = None, None
+        self.offsets, self.firsts, self.ends = (None,)*3
+
+    def add(self, children):
+        self.groups[children.parent.name] = children
+        self.blob = None
+
+    def discard(self, paths):
+        '''
+        Forget the children of the given paths and of everything beneath
+        them.
+        '''
+        paths = set(paths)
+        beneath = tuple(p + os.sep for p in paths)
+        for path in [p for p in self.groups
+                     if p in paths or p.startswith(beneath)]:
+            del self.groups[path]
+        self.blob = None
+
+    def find(self, string):
+        '''
+        Return (key, children, index) for each child whose basename contains
+        string, in the order they're in the tree. Keys are worked out from
+        that of their parent, once for each directory rather than each child.
+        '''
+        if self.blob is None:
+            self.order = list(self.groups.values())
+            self.firsts = [0]
+            self.firsts.extend(accumulate(len(c) for c in self.order))
+            names = [n for c in self.order for n in c.entries.names]
+            # both end with one past the last, so there's always an n + 1
+            self.offsets = [0]
+            self.offsets.extend(accumulate(len(name) + 1 for name in names))
+            self.ends = [self.offsets[n] for n in self.firsts[1:]]
+            # NUL can't appear in a name, so no match can span two of them
+            self.blob = '\0'.join(names)
+        found = []
+        i = self.blob.find(string)
+        while i != -1:
+            # every match in one directory before moving on to the next
+            group = bisect_right(self.ends, i)
+            children, first = self.order[group], self.firsts[group]
+            key = children.parent.key()
+            while i != -1 and i < self.ends[group]:
+                n = bisect_right(self.offsets, i) - 1
+                found.append((key + [n - first], children, n - first))
+                i = self.blob.find(string, self.offsets[n + 1])
+        found.sort(key=lambda match: match[0])
+        return found
@@ -0,0 +1,201 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import itertools
+import os
+import threading
+import time
+
+from queue import PriorityQueue
+
+from .walk import Entries, Walker, compact
+
+FLUSH = 5  # seconds between writing out the cache while busy sizing
+
+
+def convert(bytes_):
+    '''
+    Takes a number of bytes as an argument and returns the most suitable human
+    readable unit conversion.
+    '''
+    if bytes_ > 1024**3:
+        return str(round(bytes_/1024**3)) + " GB"
+    elif bytes_ > 1024**2:
+        return str(round(bytes_/1024**2)) + " MB"
+    else:
+        return str(round(bytes_/1024)) + " KB"
+
+
+def scan(path, listings):
+    '''
+    Return the Entries of a directory, from the listing cache if the tree has
+    already loaded it.
+    '''
+    entries = listings.get(path)
+    if entries is not None:
+        return entries
+    try:
+        with os.scandir(path) as it:
+            return compact(it, False)
+    except OSError:
+        return Entries()  # probably permission denied, so count it as empty
+
+
+def contents(path, listings, cache=None):
+    '''
+    Return the number and bytes of the files directly inside a directory,
+    along with the paths of its subdirectories, from the persistent cache if
+    the directory hasn't changed since it was last counted.
+    '''
+    st = None
+    if cache is not None:
+        try:
+            st = os.stat(path)
+        except OSError:
+            pass
+        else:
+            hit = cache.get(st)
+            if hit is not None:
+                files, bytes_, names = hit
+                return files, bytes_, [os.path.join(path, n) for n in names]
+    files, bytes_, subdirs = 0, 0, []
+    entries, prefix = scan(path, listings), os.path.join(path, '')
+    for name in entries.names:
+        if name in entries.dirs:
+            subdirs.append(prefix + name)
+            continue
+        files += 1
+        try:
+            bytes_ += os.lstat(prefix + name).st_size
+        except OSError:
+            continue  # vanished from under us
+    if st is not None:
+        cache.put(st, files, bytes_, [os.path.basename(d) for d in subdirs])
+    return files, bytes_, subdirs
+
+
+def calc(path, listings, totals, cache=None, walker=None, lock=None):
+    '''
+    Return the number of files and bytes beneath a directory. Works bottom-up
+    in a single post-order walk, recording the totals of every directory on
+    the way, so a directory that has been totalled is never walked again and
+    a parent's total is just the sum of its children's. Given a walker, the
+    contents of the subdirectories coming up are read in the meantime. Totals
+    are only added while holding lock, if given.
+    '''
+    if path in totals:
+        return totals[path]
+    lock = lock or threading.Lock()
+
+    def read(path):
+        return contents(path, listings, cache)
+
+    def unsized(found):
+        return [s for s in found[2] if s not in totals]
+
+    reader = (walker or Walker(1)).reader(read, unsized)
+    files, bytes_, subdirs = reader.get(path)
+    stack = [(path, iter(subdirs), [files, bytes_])]
+    while stack:
+        top, subdirs, total = stack[-1]
+        for subdir in subdirs:
+            if subdir not in totals:
+                files, bytes_, children = reader.get(subdir)
+                stack.append((subdir, iter(children), [files, bytes_]))
+                break  # come back to the rest of this one later
+            reader.skip(subdir)  # totalled while it was being read ahead
+            total[0] += totals[subdir][0]
+            total[1] += totals[subdir][1]
+        else:
+            stack.pop()
+            with lock:
+                totals[top] = tuple(total)
+            if stack:
+                stack[-1][2][0] += total[0]
+                stack[-1][2][1] += total[1]
+    return totals[path]
+
+
+class Sizes:
+    '''
+    A bounded pool of worker threads that work out disk usage in the
+    background, lowest priority first, writing each result into the sized
+    dictionary of the state it was submitted with.
+    '''
+    def __init__(self, workers=4, cache=None, walker=None):
+        self.workers = workers
+        self.cache = cache  # persistent cache of directory contents
+        self.walker = walker  # to read directories ahead of calc
+        self.threads = []
+        self.queue = PriorityQueue()
+        self.lock = threading.Lock()
+        self.count = itertools.count()  # keeps equal priorities in order
+        self.generation = 0
+        self.queued = {}
+        self.flushed = time.monotonic()  # when the cache was last written
+        self.running = {}  # name being sized to the sized it's going to
+
+    def submit(self, node, priority):
+        '''
+        Queue a node for sizing, or move it up the queue if it is already
+        waiting with a lower priority. Does nothing if it's being sized.
+        '''
+        state = node.state
+        with self.lock:
+            if self.running.get(node.name) is state.sized:
+                return
+            if node.name in self.queued and self.queued[node.name] <= priority:
+                return
+            self.queued[node.name] = priority
+            job = (priority, next(self.count), self.generation, node,
+                   state.sized, state.listings, state.totals, state.lock)
+        self.queue.put(job)
+        if len(self.threads) < self.workers:
+            thread = threading.Thread(target=self.work, daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def cancel(self):
+        '''
+        Forget everything that is queued. Jobs already running finish, but
+        their results go to the state they were submitted with.
+        '''
+        with self.lock:
+            self.generation += 1
+            self.queued = {}
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            (priority, _, generation, node, sized, listings, totals,
+             lock) = job
+            with self.lock:
+                # skip cancelled jobs and duplicates queued at a lower priority
+                if (generation != self.generation or
+                        self.queued.get(node.name) != priority):
+                    continue
+                del self.queued[node.name]
+                self.running[node.name] = sized
+            try:
+                if sized.get(node.name, '') is None:
+                    try:
+                        if node.isdir():
+                            bytes_ = calc(node.name, listings, totals,
+                                          self.cache, self.walker, lock)[1]
+                        else:
+                            bytes_ = node.stat().st_size
+                        size = " [" + convert(bytes_) + "]"
+                    except OSError:
+                        size = " [?]"
+                    with lock:
+                        sized[node.name] = size
+                    # once the queue is drained, or every so often, rather
+                    # than after each job, as workers wait while it writes
+                    if self.cache is not None and (
+                            self.queue.empty() or
+                            time.monotonic() - self.flushed > FLUSH):
+                        self.flushed = time.monotonic()
+                        self.cache.flush()
+            finally:
+                with self.lock:
+                    del self.running[node.name]
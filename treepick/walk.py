@@ -0,0 +1,332 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import heapq
+import os
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+CHUNK = 4096  # entries listed before the rest are left to the background
+FILE, DIR, LINK = range(3)  # the kinds of entry in a listing
+
+
+def walk(top, hidden=True, descend=None):
+    '''
+    Generator that streams (entry, depth) for everything beneath top in the
+    same sorted, depth first order as the tree, without keeping any listings
+    beyond those of the directories it is part way through. Symlinks to
+    directories aren't followed, and a directory is only entered if descend
+    returns True for its path.
+    '''
+    stack = [(iter(scan(top, hidden)), 1)]
+    while stack:
+        entries, depth = stack[-1]
+        for entry in entries:
+            yield entry, depth
+            try:
+                isdir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if isdir and (descend is None or descend(entry.path)):
+                stack.append((iter(scan(entry.path, hidden)), depth + 1))
+                break
+        else:
+            stack.pop()
+
+
+def scan(path, hidden=True):
+    '''
+    Return the sorted entries of a directory, without dotfiles if hidden is
+    set, or nothing if it can't be read.
+    '''
+    try:
+        with os.scandir(path) as it:
+            if hidden:
+                entries = [e for e in it if not e.name.startswith('.')]
+            else:
+                entries = list(it)
+    except OSError:
+        return []  # probably permission denied
+    entries.sort(key=lambda e: e.name)
+    return entries
+
+
+class Entries:
+    '''
+    A sorted directory listing kept as just the basename of each entry, along
+    with the sets of those that are directories and symlinks, rather than an
+    os.DirEntry for each, which costs several times as much. The nodes made
+    for the entries share these very strings rather than copies.
+    '''
+    __slots__ = ('names', 'dirs', 'links')
+
+    def __init__(self, names=None, dirs=None, links=None):
+        self.names = [] if names is None else names
+        self.dirs = set() if dirs is None else dirs  # not through symlinks
+        self.links = set() if links is None else links
+
+    def __len__(self):
+        return len(self.names)
+
+    def kind(self, name):
+        if name in self.dirs:
+            return DIR
+        if name in self.links:
+            return LINK
+        return FILE
+
+    def add(self, entry):
+        '''
+        Add an os.DirEntry from scandir on the end, without sorting.
+        '''
+        name = entry.name
+        self.names.append(name)
+        try:
+            if entry.is_symlink():
+                self.links.add(name)
+            elif entry.is_dir(follow_symlinks=False):
+                self.dirs.add(name)
+        except OSError:
+            pass  # vanished from under us, so call it a file
+
+    def merged(self, other):
+        '''
+        Return a new sorted listing of both of us.
+        '''
+        return Entries(sorted(self.names + other.names),
+                       self.dirs | other.dirs, self.links | other.links)
+
+
+def compact(entries, order=True):
+    '''
+    Return os.DirEntry objects from scandir as Entries, sorted unless order
+    is False.
+    '''
+    compacted = Entries()
+    for entry in entries:
+        compacted.add(entry)
+    if order:
+        compacted.names.sort()
+    return compacted
+
+
+class Listing:
+    '''
+    A directory listed a chunk at a time, so the first entries can be shown
+    straight away while the rest are read in the background. The sorted
+    entries read so far are swapped for new Entries as they grow, rather than
+    changed in place, so they can be taken from another thread at any time.
+    Raises OSError if the directory can't be listed at all.
+    '''
+    def __init__(self, path, chunk=CHUNK):
+        self.path = path
+        self.lock = threading.Lock()
+        self.grown, self.done, self.stopped = False, False, False
+        self.whole = False  # only to be shown once it has all been read
+        it = os.scandir(path)
+        try:
+            first = list(islice(it, chunk))
+        except OSError:
+            it.close()
+            raise
+        self.entries = compact(first)
+        if len(first) < chunk:
+            it.close()
+            self.done = True
+        else:
+            threading.Thread(target=self.read, args=(it, chunk),
+                             daemon=True).start()
+
+    def read(self, it, chunk):
+        # each batch is at least as big as everything before it, so sorting
+        # them in costs no more than sorting the whole listing twice
+        pending = Entries()
+        with it:
+            try:
+                for entry in it:
+                    if self.stopped:
+                        return
+                    pending.add(entry)
+                    if len(pending) >= max(chunk, len(self.entries)):
+                        self.publish(pending)
+                        pending = Entries()
+            except OSError:
+                pass  # gone from under us, so settle for what we have
+        self.publish(pending)
+        self.done = True
+
+    def publish(self, pending):
+        if pending:
+            entries = self.entries.merged(pending)
+            with self.lock:
+                self.entries, self.grown = entries, True
+
+    def take(self):
+        '''
+        Return True if more entries have been read since we were last asked.
+        '''
+        with self.lock:
+            grown, self.grown = self.grown, False
+        return grown
+
+    def stop(self):
+        self.stopped = True
+
+
+class Reader:
+    '''
+    Reads directories for a depth first walk over a pool of threads. Every
+    directory read adds its subdirectories to those waiting to be read, and
+    the pool always reads the waiting directory that comes first in the walk,
+    so it keeps just ahead of the walk however deep or wide the tree is.
+    At most window reads can be started but not yet asked for at once, and to
+    make room for nearer ones, finished reads that the walk won't reach for a
+    while are dropped, to be read again later.
+    '''
+    def __init__(self, pool, window, read, subdirs):
+        self.pool = pool
+        self.window = window
+        self.read = read  # path to result
+        self.subdirs = subdirs  # result to the paths it leads to, in order
+        self.lock = threading.Lock()
+        self.keys = {}  # position in the walk of each path known about
+        self.waiting = []  # heap of (key, path) of those not started
+        self.started = {}  # path to (key, future) of those started
+
+    def ahead(self, path, key):
+        result = self.read(path)
+        if self.pool is not None:
+            with self.lock:
+                for i, subdir in enumerate(self.subdirs(result)):
+                    if subdir not in self.keys:
+                        self.keys[subdir] = key + (i,)
+                        heapq.heappush(self.waiting, (key + (i,), subdir))
+                self.fill()
+        return result
+
+    def fill(self):
+        '''
+        Start reading the waiting directories that come first, while there's
+        room. Called with the lock held.
+        '''
+        while self.waiting:
+            key, path = self.waiting[0]
+            if self.keys.get(path) != key or path in self.started:
+                heapq.heappop(self.waiting)  # asked for or started already
+                continue
+            if len(self.started) >= self.window:
+                # make room by giving up the furthest read that isn't being
+                # read right now, if it's further than this one
+                idle = [(k, p) for p, (k, f) in self.started.items()
+                        if not f.running()]
+                if not idle or max(idle)[0] < key:
+                    break
+                far, farpath = max(idle)
+                self.started.pop(farpath)[1].cancel()
+                heapq.heappush(self.waiting, (far, farpath))
+            heapq.heappop(self.waiting)
+            try:
+                future = self.pool.submit(self.ahead, path, key)
+            except RuntimeError:
+                # the pool has been shut down, so get reads them itself
+                self.pool = None
+                return
+            self.started[path] = (key, future)
+
+    def get(self, path):
+        '''
+        Return the result for a path, waiting for it if it has been started,
+        or reading it now if not.
+        '''
+        with self.lock:
+            key = self.keys.pop(path, ())
+            key, future = self.started.pop(path, (key, None))
+        if future is None:
+            return self.ahead(path, key)
+        return future.result()
+
+    def skip(self, path):
+        '''
+        Say a path won't be asked for after all, to make room for another.
+        '''
+        with self.lock:
+            self.keys.pop(path, None)
+            self.started.pop(path, None)
+
+
+class Walker:
+    '''
+    A bounded pool of threads that read directories ahead of whoever is
+    walking them, so slow filesystems can be asked for many listings at
+    once, while results are still handed back in the order they were asked
+    for. With fewer than two workers everything is read in the calling
+    thread, just as it would be without one.
+    '''
+    def __init__(self, workers=8, window=None):
+        self.workers = workers
+        self.window = window or workers * 8
+        self.pool = None
+        if workers > 1:  # its threads are only started as they're needed
+            self.pool = ThreadPoolExecutor(workers)
+
+    def reader(self, read, subdirs):
+        '''
+        Return a reader for a walk, that reads paths with read and then reads
+        ahead the paths that subdirs picks out of the result. Without a pool
+        it just reads.
+        '''
+        return Reader(self.pool, self.window, read, subdirs)
+
+    def map(self, func, items):
+        '''
+        Generator that yields func of each item, in order, with the calls for
+        the next few items already running in the pool.
+        '''
+        if self.pool is None:
+            for item in items:
+                yield func(item)
+            return
+        pending = deque()
+        for item in items:
+            pending.append(self.pool.submit(func, item))
+            if len(pending) > self.window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def walk(self, top, hidden=True, descend=None):
+        '''
+        Just like walk, in exactly the same order, but with the listings of
+        the directories coming up read in the meantime.
+        '''
+        if self.pool is None:
+            yield from walk(top, hidden, descend)
+            return
+
+        def enters(entry):
+            try:
+                isdir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                return False
+            return isdir and (descend is None or descend(entry.path))
+
+        reader = self.reader(
+            lambda path: scan(path, hidden),
+            lambda entries: [e.path for e in entries if enters(e)])
+        stack = [(iter(reader.get(top)), 1)]
+        while stack:
+            entries, depth = stack[-1]
+            for entry in entries:
+                yield entry, depth
+                if enters(entry):
+                    stack.append((iter(reader.get(entry.path)), depth + 1))
+                    break
+            else:
+                stack.pop()
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
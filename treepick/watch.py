@@ -0,0 +1,134 @@
+# Copyright (c) 2018, Toby Slight. All rights reserved.
+# ISC License (ISCL) - see LICENSE file for details.
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import struct
+import sys
+
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE |
+        IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+# events that change which entries a directory has, rather than what's in them
+ENTRIES = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+           IN_DELETE_SELF | IN_MOVE_SELF | IN_Q_OVERFLOW)
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, len, then len bytes of name
+
+
+def libc():
+    '''
+    Return the C library if it has inotify, or None.
+    '''
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        lib = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                          use_errno=True)
+        lib.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    lib.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                      ctypes.c_uint32]
+    lib.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return lib
+
+
+class Watcher:
+    '''
+    Watches a set of directories with inotify and reports which of them have
+    had entries added, removed, renamed or written to. Does nothing at all
+    where inotify isn't available, or if it can't be set up.
+    '''
+    def __init__(self):
+        self.fd = None
+        self.wds, self.paths = {}, {}  # wd to path, and path to wd or None
+        self.lib = libc()
+        if self.lib is None:
+            return
+        fd = self.lib.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd >= 0:
+            self.fd = fd
+
+    def sync(self, paths):
+        '''
+        Watch exactly the given set of directories, adding and removing only
+        the watches that differ from last time.
+        '''
+        if self.fd is None:
+            return
+        for path in self.paths.keys() - paths:
+            wd = self.paths.pop(path)
+            if wd is not None:
+                self.lib.inotify_rm_watch(self.fd, wd)
+                self.wds.pop(wd, None)
+        for path in paths - self.paths.keys():
+            wd = self.lib.inotify_add_watch(self.fd, os.fsencode(path), MASK)
+            if wd < 0:
+                # not a directory, gone, not ours, or out of watches - any way
+                # it's remembered as unwatched, so it isn't tried every time
+                wd = None
+            else:
+                self.wds[wd] = path
+            self.paths[path] = wd
+
+    def read(self):
+        '''
+        Return a dictionary of the watched directories that have changed since
+        last time, to a dictionary of the names that changed in each to the
+        events they had, or'd together. A directory that goes away is reported
+        as a change in its parent, and an empty name means we can't tell what
+        changed as the kernel's queue overflowed.
+        '''
+        changes = {}
+        if self.fd is None:
+            return changes
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                offset += EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    for path in self.wds.values():
+                        names = changes.setdefault(path, {})
+                        names[''] = names.get('', 0) | mask
+                    continue
+                path = self.wds.get(wd)
+                if path is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self.wds[wd]
+                    self.paths[path] = None
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    name, path = os.path.basename(path), os.path.dirname(path)
+                names = changes.setdefault(path, {})
+                names[name] = names.get(name, 0) | mask
+        return changes
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None